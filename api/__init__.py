@@ -11,4 +11,4 @@ db = SQLAlchemy(app)
 migrator = Migrate(app, db)
 login = LoginManager(app)
 
-from api import routes, models
+from api import routes, front_routes, models, commands, admission
@@ -0,0 +1,103 @@
+"""Admission control, so the app sheds load instead of queueing it.
+
+Every request except /metrics must get one of ADMISSION_MAX_ACTIVE slots
+before it's handled, and gives it back once its response has been sent.
+When every slot is taken, up to ADMISSION_MAX_QUEUE requests wait for one,
+for at most ADMISSION_MAX_WAIT seconds. Past that, requests are turned
+away at once with 503 and a Retry-After header. Without this, an
+overloaded server lets every request in and they all wait on SQLite's write
+lock until they time out together. Turning some away keeps the latency of
+the others bounded.
+
+The number of requests being handled and waiting, and how many have been
+shed, are exported at /metrics, along with api.ratelimit's rejections.
+"""
+from collections import Counter
+from threading import Condition
+from time import monotonic
+from flask import g, request as incoming_request
+from api import app
+from config import Config
+
+EXEMPT_ENDPOINTS = {'metrics', 'static'}
+
+
+class AdmissionController:
+    """A fixed number of slots, with a short, bounded queue for them."""
+
+    def __init__(self, max_active: int, max_queue: int, max_wait: float):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        # Number of shed requests, keyed by "queue_full" or "timeout".
+        self.shed = Counter()
+        self.condition = Condition()
+
+    def admit(self) -> bool:
+        """Take a slot, waiting if need be. False if the request is shed."""
+        with self.condition:
+            if self.active >= self.max_active:
+                if self.queued >= self.max_queue:
+                    self.shed['queue_full'] += 1
+                    return False
+                self.queued += 1
+                deadline = monotonic() + self.max_wait
+                try:
+                    while self.active >= self.max_active:
+                        remaining = deadline - monotonic()
+                        if remaining <= 0:
+                            self.shed['timeout'] += 1
+                            return False
+                        self.condition.wait(remaining)
+                finally:
+                    self.queued -= 1
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        """Give a slot back."""
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def metrics(self) -> dict:
+        """The controller's limits and counters."""
+        with self.condition:
+            return {
+                'active': self.active,
+                'queued': self.queued,
+                'max_active': self.max_active,
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'shed': dict(self.shed),
+            }
+
+
+controller = AdmissionController(
+    Config.ADMISSION_MAX_ACTIVE,
+    Config.ADMISSION_MAX_QUEUE,
+    Config.ADMISSION_MAX_WAIT
+)
+
+
+@app.before_request
+def admit_request():
+    """Hold a slot for the request, or shed it."""
+    if not app.config['ADMISSION_ENABLED'] \
+            or incoming_request.endpoint in EXEMPT_ENDPOINTS:
+        return None
+    if not controller.admit():
+        return ("Server is overloaded.", 503, {'Retry-After': '1'})
+    g.admitted = True
+    return None
+
+
+@app.teardown_request
+def release_request(error=None):
+    """Give back the slot held by the request, once it's done with."""
+    if g.pop('admitted', False):
+        controller.release()
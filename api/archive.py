@@ -0,0 +1,65 @@
+"""Move old list entries to the archive table.
+
+Every /list request reads the whole list_entry table, so entries which
+have been around for longer than Config.ARCHIVE_AFTER are moved to
+list_entry_archive, where they're only read when a client asks for them.
+
+The entries are moved a batch at a time, each batch in its own short
+transaction, with a pause in between so that other writers aren't locked
+out of the database for the length of the whole job.
+"""
+from datetime import datetime
+from time import sleep
+from api import app, db
+from api.models import ArchivedListEntry, ListEntry
+
+entries = ListEntry.__table__
+archive = ArchivedListEntry.__table__
+
+
+def archive_batch(cutoff: float, batch_size: int) -> int:
+    """Move up to 'batch_size' entries created before cutoff.
+
+    Returns the number of entries moved.
+    """
+    identifiers = [
+        row[0] for row in db.session.query(entries.c.identifier)
+        .filter(entries.c.creation_time < cutoff)
+        .order_by(entries.c.creation_time)
+        .limit(batch_size)
+    ]
+    if not identifiers:
+        return 0
+    chosen = entries.c.identifier.in_(identifiers)
+    db.session.execute(archive.insert().from_select(
+        list(archive.columns.keys()), entries.select().where(chosen)
+    ))
+    db.session.execute(entries.delete().where(chosen))
+    db.session.commit()
+    return len(identifiers)
+
+
+def archive_old_entries(
+            max_age: float=None,
+            batch_size: int=None,
+            pause: float=None
+        ) -> int:
+    """Archive every entry older than 'max_age' seconds.
+
+    Defaults are taken from the ARCHIVE_* config values. Returns the number
+    of entries moved.
+    """
+    if max_age is None:
+        max_age = app.config['ARCHIVE_AFTER']
+    if batch_size is None:
+        batch_size = app.config['ARCHIVE_BATCH_SIZE']
+    if pause is None:
+        pause = app.config['ARCHIVE_PAUSE']
+    cutoff = datetime.now().timestamp() - max_age
+    moved = 0
+    while True:
+        count = archive_batch(cutoff, batch_size)
+        moved += count
+        if count < batch_size:
+            return moved
+        sleep(pause)
@@ -0,0 +1,131 @@
+"""Fill in data for a schema migration while the API keeps running.
+
+A migration that adds a column and fills it with a single UPDATE holds a
+lock on the whole table until every row has been written, which for
+list_entry can be minutes. Instead, a migration can add the column, then
+call backfill_in_migration to fill it in batches, e.g.
+
+    from api.backfill import backfill_in_migration
+
+    def upgrade():
+        op.add_column('list_entry', sa.Column('list', sa.Integer()))
+        entries = sa.table('list_entry', sa.column('identifier'),
+                           sa.column('list'))
+        backfill_in_migration(entries, {'list': 1}, key='identifier',
+                              where=entries.c.list.is_(None),
+                              checkpoint=f"{revision}.backfill")
+
+Rows are visited in order of primary key ("keyset" batches: each batch
+starts after the last key of the one before, so finding it doesn't get
+slower as the backfill goes on), and each batch is committed on its own,
+with a pause in between so other writers can get at the table. Progress is
+logged after every batch. If a 'checkpoint' file is given, the last key
+done is recorded in it, and a backfill which was interrupted picks up from
+there when it's run again; the file is removed once the backfill finishes.
+"""
+from json import dumps as toJSONtext, loads as fromJSONtext
+from logging import getLogger
+from os import remove, replace
+from os.path import exists
+from time import monotonic, sleep
+from sqlalchemy import func, select, true
+
+log = getLogger(__name__)
+
+
+def read_checkpoint(path: str) -> dict:
+    """The progress recorded by an earlier run, or None."""
+    if path and exists(path):
+        with open(path) as file:
+            return fromJSONtext(file.read())
+    return None
+
+
+def write_checkpoint(path: str, last_key, done: int):
+    """Record the last key backfilled, and how many rows were, atomically."""
+    if path:
+        with open(path + ".tmp", 'w') as file:
+            file.write(toJSONtext({'last_key': last_key, 'done': done}))
+        replace(path + ".tmp", path)
+
+
+def backfill(
+            connection,
+            table,
+            values: dict,
+            key: str=None,
+            where=None,
+            batch_size: int=1000,
+            pause: float=0.05,
+            checkpoint: str=None
+        ) -> int:
+    """Set 'values' on the rows of table matching 'where', in batches.
+
+    Rows are taken in order of the unique column named 'key', which
+    defaults to the table's primary key if it has a single-column one (a
+    table made with sqlalchemy.table, as in migrations, has none, so 'key'
+    must be given). Each batch is committed before the next is started, so
+    'connection' mustn't be in the middle of a transaction which needs to
+    be kept together with the backfill. Returns the number of rows updated,
+    including those updated by earlier runs recorded in 'checkpoint'.
+    """
+    if key is None:
+        key, = table.primary_key.columns
+    else:
+        key = table.c[key]
+    if where is None:
+        where = true()
+    progress = read_checkpoint(checkpoint)
+    last_key, done = (None, 0) if progress is None \
+        else (progress['last_key'], progress['done'])
+    after = where if last_key is None else where & (key > last_key)
+    total = done + connection.execute(
+        select(func.count()).select_from(table).where(after)
+    ).scalar()
+    log.info("Backfilling %d rows of %s.", total - done, table.name)
+    # as in a migration's autocommit_block, where each statement is
+    # committed by itself.
+    autocommit = connection.get_execution_options().get(
+        'isolation_level'
+    ) == 'AUTOCOMMIT'
+    started, already_done = monotonic(), done
+    while True:
+        query = select(key).where(where).order_by(key).limit(batch_size)
+        if last_key is not None:
+            query = query.where(key > last_key)
+        keys = [row[0] for row in connection.execute(query)]
+        if not keys:
+            break
+        # 'where' is checked again, in case a row was changed since it was
+        # selected.
+        connection.execute(
+            table.update().where(key.in_(keys) & where).values(values)
+        )
+        if not autocommit:
+            connection.commit()
+        last_key = keys[-1]
+        done += len(keys)
+        write_checkpoint(checkpoint, last_key, done)
+        log.info(
+            "Backfilled %d/%d rows of %s (%.0f rows/s).", done, total,
+            table.name,
+            (done - already_done) / max(monotonic() - started, 1e-9)
+        )
+        if len(keys) < batch_size:
+            break
+        sleep(pause)
+    if checkpoint and exists(checkpoint):
+        remove(checkpoint)
+    return done
+
+
+def backfill_in_migration(table, values: dict, **kwargs) -> int:
+    """Run backfill from an Alembic migration, outside its transaction.
+
+    The migration's transaction is committed first, so any schema changes
+    made before the backfill are kept even if it's interrupted. Takes the
+    same keyword arguments as backfill.
+    """
+    from alembic import op
+    with op.get_context().autocommit_block():
+        return backfill(op.get_bind(), table, values, **kwargs)
@@ -0,0 +1,94 @@
+"""Commands added to the flask command line interface.
+
+Run them with the FLASK_APP environment variable pointing at the api
+package, e.g.
+    FLASK_APP=api flask loadgen --duration 30
+"""
+from json import dumps as toJSONtext
+import click
+from api import app
+
+
+@app.cli.command()
+@click.option('--users', default=10, help="Number of users to create.")
+@click.option('--duration', default=10.0, help="Seconds to run for.")
+@click.option(
+    '--concurrency', default=10,
+    help="Number of clients sending requests back to back."
+)
+@click.option(
+    '--rate', default=0.0,
+    help="Requests to start per second. Overrides --concurrency."
+)
+@click.option(
+    '--mix', default=None,
+    help='Relative weights of each request, e.g. '
+         '"GET /entry=50,POST /entry=20,DELETE /entry=10,GET /list=20".'
+)
+@click.option('--host', default="127.0.0.1", help="Address to serve on.")
+@click.option('--port', default=0, help="Port to serve on, 0 for any.")
+@click.option(
+    '--rate-limit/--no-rate-limit', default=False,
+    help="Leave the per-uid and per-address rate limits on."
+)
+def loadgen(users, duration, concurrency, rate, mix, host, port, rate_limit):
+    """Load test the API against a local server, reporting JSON stats."""
+    from api import loadgen
+    try:
+        mix = loadgen.parse_mix(mix) if mix else None
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint='--mix')
+    click.echo(toJSONtext(loadgen.run(
+        users=users,
+        duration=duration,
+        concurrency=concurrency,
+        rate=rate,
+        mix=mix,
+        host=host,
+        port=port,
+        rate_limit=rate_limit
+    ), indent=2))
+
+
+@app.cli.command('export-ndjson')
+@click.argument('output', type=click.File('w'), default='-')
+@click.option(
+    '--batch-size', default=1000, help="Rows to fetch at once."
+)
+def export_ndjson(output, batch_size):
+    """Export users and entries (with archived ones) as NDJSON."""
+    from api.ndjson import export_rows
+    count = export_rows(output, batch_size=batch_size)
+    click.echo(f"Exported {count} rows.", err=True)
+
+
+@app.cli.command('import-ndjson')
+@click.argument('input', type=click.File('r'), default='-')
+@click.option(
+    '--checkpoint', default=None,
+    help="File recording progress, to resume an interrupted import."
+)
+@click.option(
+    '--chunk-size', default=1000, help="Rows to insert per transaction."
+)
+def import_ndjson(input, checkpoint, chunk_size):
+    """Import users and entries from an NDJSON export."""
+    from api.ndjson import import_rows
+    count = import_rows(input, checkpoint=checkpoint, chunk_size=chunk_size)
+    click.echo(f"Imported {count} rows.", err=True)
+
+
+@app.cli.command('archive-entries')
+@click.option(
+    '--max-age', default=None, type=float,
+    help="Archive entries older than this many seconds."
+)
+@click.option(
+    '--batch-size', default=None, type=int,
+    help="Entries to move per transaction."
+)
+def archive_entries(max_age, batch_size):
+    """Move old entries from list_entry to the archive table."""
+    from api.archive import archive_old_entries
+    count = archive_old_entries(max_age=max_age, batch_size=batch_size)
+    click.echo(f"Archived {count} entries.", err=True)
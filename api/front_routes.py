@@ -1,14 +1,90 @@
+"""Routes for viewing the list in a browser.
+
+The page is built from the same rows as /list, each rendered into an HTML
+fragment by the "row" macro in display_list.html. Entries can't be
+edited, so a row's fragment is rendered the first time it's needed and
+reused for every later page. When the storage engine's version changes, or
+the cache grows past PRUNE_FACTOR times the length of the list (entries
+deleted or archived by other processes don't change this process's
+version), the fragments of entries which are no longer in the list are
+dropped. The rows are all read before the response starts, then the page is
+streamed as it's rendered, so the browser can show the head of the page
+while the rows' fragments are still being rendered.
 """
+from flask import (
+    request as incoming_request, Response, get_template_attribute,
+    stream_with_context
+)
+from threading import Lock
+from api import app
+from api.ratelimit import rate_limit_response
+from api.routes import request_is_unauthorized
+from api.storage import get_storage
+
+# Rendered rows, keyed by the row tuple itself. Several pages may be
+# streamed at once, so the cache is only changed while holding the lock.
+_fragments = {}
+_fragments_version = None
+_fragments_lock = Lock()
+PRUNE_FACTOR = 2
+
+
+def fragments_for(rows: list, version: int):
+    """Generate the HTML fragment of each row, rendering only new ones."""
+    global _fragments, _fragments_version
+    with _fragments_lock:
+        if version != _fragments_version \
+                or len(_fragments) > PRUNE_FACTOR * len(rows):
+            wanted = set(rows)
+            _fragments = {
+                row: fragment for row, fragment in _fragments.items()
+                if row in wanted
+            }
+            _fragments_version = version
+        fragments = _fragments
+    render_row = None
+    for row in rows:
+        fragment = fragments.get(row)
+        if fragment is None:
+            if render_row is None:
+                render_row = get_template_attribute(
+                    "display_list.html", "row"
+                )
+            fragment = str(render_row(*row))
+            with _fragments_lock:
+                fragments[row] = fragment
+        yield fragment
+
+
 @app.route("/")
 def display_list():
-    if user_is_unauthorized(
-                incoming_request.values.get("uid"),
-                incoming_request.values.get('token')
-            ):
-        return ("Unauthorized", 401)
-    return render_template(
-        "display_list.html",
-        title="List",
-        listvals=[loads(entry.json) for entry in ListEntry.query.all]
+    """The list as an HTML page.
+
+    Since this is meant to be opened in a browser, the uid and token (or
+    session) are taken from the query string as well as the headers.
+    """
+    if "uid" in incoming_request.values:
+        credentials = incoming_request.values
+    else:
+        credentials = incoming_request.headers
+    limited = rate_limit_response(
+        credentials.get("uid"), incoming_request.remote_addr
     )
-"""
+    if limited:
+        return limited
+    if request_is_unauthorized(credentials):
+        return ("Unauthorized", 401)
+    storage = get_storage()
+    version = storage.version
+    # read before streaming starts, so that a failure is still a 500.
+    rows = storage.all()
+
+    @stream_with_context
+    def generate():
+        def macro(name: str):
+            return get_template_attribute("display_list.html", name)
+        yield str(macro("head")("List"))
+        for fragment in fragments_for(rows, version):
+            yield '\n' + fragment
+        yield '\n' + str(macro("foot")())
+    return Response(generate(), mimetype='text/html')
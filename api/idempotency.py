@@ -0,0 +1,201 @@
+"""Idempotency keys, so a retried POST doesn't add an entry twice.
+
+A client sends an Idempotency-Key header with a POST, unique to the entry
+it means to add, and sends the same key again if it has to retry. The
+first response for each (uid, key) pair is kept for IDEMPOTENCY_TTL seconds,
+and retries get that response back, with an Idempotent-Replayed header,
+without the entry being added again. A retry which arrives while the first
+request is still being handled gets 409 and a Retry-After header, and
+reusing a key for a request with a different body gets 422.
+
+Responses are kept in memory, in a bounded LRU like the rate limiter's
+buckets. If IDEMPOTENCY_TABLE is set, keys are also claimed and responses
+stored in the idempotent_response table, so a retry which reaches another
+process is replayed too.
+"""
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+from time import time
+from flask import make_response
+from sqlalchemy.exc import IntegrityError
+from api import app, db
+from config import Config
+
+MAX_KEY_LENGTH = 64
+# Stands in for the response to a request which is still being handled.
+PENDING = None
+
+
+class IdempotencyStore:
+    """Responses by (uid, key), each kept for 'ttl' seconds.
+
+    A response is a (status, content type, body) tuple. Like the rate
+    limiter, the least recently used keys are dropped once there are more
+    than 'max_keys' of them.
+    """
+
+    def __init__(self, ttl: float, max_keys: int=10000):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        # (uid, key) -> (expires, fingerprint, response or PENDING)
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def _put(self, uid_key: tuple, value: tuple):
+        self.entries[uid_key] = value
+        self.entries.move_to_end(uid_key)
+        if len(self.entries) > self.max_keys:
+            self.entries.popitem(last=False)
+
+    def begin(self, uid: int, key: str, fingerprint: str, now: float=None):
+        """Claim a key for a new request.
+
+        Returns None if the key was free, and is now claimed. Otherwise
+        returns the (fingerprint, response) stored for it, where the
+        response is PENDING if the request is still being handled.
+        """
+        if now is None:
+            now = time()
+        with self.lock:
+            stored = self.entries.get((uid, key))
+            if stored is not None and stored[0] > now:
+                self.entries.move_to_end((uid, key))
+                return stored[1:]
+            self._put((uid, key), (now + self.ttl, fingerprint, PENDING))
+            return None
+
+    def finish(
+                self,
+                uid: int,
+                key: str,
+                fingerprint: str,
+                response: tuple,
+                expires: float=None
+            ):
+        """Store the response to a request, for its retries."""
+        if expires is None:
+            expires = time() + self.ttl
+        with self.lock:
+            self._put((uid, key), (expires, fingerprint, response))
+
+    def abandon(self, uid: int, key: str):
+        """Release the claim on a key whose request got no response."""
+        with self.lock:
+            stored = self.entries.get((uid, key))
+            if stored is not None and stored[2] is PENDING:
+                del self.entries[(uid, key)]
+
+
+store = IdempotencyStore(Config.IDEMPOTENCY_TTL, Config.IDEMPOTENCY_MAX_KEYS)
+
+
+def fingerprint_of(*parts) -> str:
+    """A hash of the parts of a request which decide its response."""
+    digest = sha256()
+    for part in parts:
+        if part is None:
+            part = b''
+        elif isinstance(part, str):
+            part = part.encode('utf-8')
+        digest.update(b'%d:' % len(part) + part)
+    return digest.hexdigest()
+
+
+def _claim_row(uid: int, key: str, fingerprint: str, now: float):
+    """Claim a key in the idempotent_response table, like store.begin."""
+    from api.models import IdempotentResponse
+    rows = IdempotentResponse.query
+    rows.filter(IdempotentResponse.expires <= now).delete()
+    db.session.add(IdempotentResponse(
+        uid=uid, key=key, fingerprint=fingerprint, expires=now + store.ttl
+    ))
+    try:
+        db.session.commit()
+        return None
+    except IntegrityError:
+        db.session.rollback()
+    row = rows.get((uid, key))
+    if row is None:
+        # it expired and was deleted in the meantime; try again next time.
+        return fingerprint, PENDING
+    if row.status is None:
+        return row.fingerprint, PENDING
+    response = (row.status, row.content_type, row.body)
+    store.finish(uid, key, row.fingerprint, response, row.expires)
+    return row.fingerprint, response
+
+
+def _finish_row(uid: int, key: str, response: tuple):
+    from api.models import IdempotentResponse
+    IdempotentResponse.query.filter_by(uid=uid, key=key).update({
+        'status': response[0],
+        'content_type': response[1],
+        'body': response[2],
+    })
+    db.session.commit()
+
+
+def _abandon_row(uid: int, key: str):
+    from api.models import IdempotentResponse
+    db.session.rollback()
+    IdempotentResponse.query.filter_by(
+        uid=uid, key=key, status=None
+    ).delete()
+    db.session.commit()
+
+
+def idempotent_response(uid: int, key: str, fingerprint: str, handle):
+    """Respond to a request with an Idempotency-Key header.
+
+    'handle' is called, with no arguments, to make the response the first
+    time the key is seen, and that response is stored for any retries. It
+    must return something make_response accepts. Responses with a 5xx
+    status aren't stored, so the request can be retried.
+    """
+    if not 0 < len(key) <= MAX_KEY_LENGTH:
+        return ("Invalid Idempotency-Key.", 400)
+    use_table = app.config['IDEMPOTENCY_TABLE']
+    now = time()
+    stored = store.begin(uid, key, fingerprint, now)
+    if stored is None and use_table:
+        stored = _claim_row(uid, key, fingerprint, now)
+        if stored is not None and stored[1] is PENDING:
+            store.abandon(uid, key)
+    if stored is not None:
+        stored_fingerprint, response = stored
+        if stored_fingerprint != fingerprint:
+            return (
+                "Idempotency-Key was already used for a different request.",
+                422
+            )
+        if response is PENDING:
+            return (
+                "A request with this Idempotency-Key is in progress.",
+                409,
+                {'Retry-After': '1'}
+            )
+        status, content_type, body = response
+        return (
+            body,
+            status,
+            {'Content-Type': content_type, 'Idempotent-Replayed': 'true'}
+        )
+    try:
+        response = make_response(handle())
+    except BaseException:
+        store.abandon(uid, key)
+        if use_table:
+            _abandon_row(uid, key)
+        raise
+    if response.status_code >= 500:
+        store.abandon(uid, key)
+        if use_table:
+            _abandon_row(uid, key)
+        return response
+    stored = (response.status_code, response.content_type,
+              response.get_data())
+    store.finish(uid, key, fingerprint, stored)
+    if use_table:
+        _finish_row(uid, key, stored)
+    return response
@@ -0,0 +1,269 @@
+"""A load generator for the API.
+
+Starts the app on a local port in a background thread, creates some users
+through User.new_token, then drives a mix of requests at it with asyncio
+for a fixed duration. Either a fixed number of clients send requests back
+to back ('concurrency'), or requests are started at a fixed 'rate' per
+second regardless of how long earlier ones take.
+
+Run it with
+    flask loadgen --help
+"""
+import asyncio
+from json import loads as fromJSONtext
+from random import choice, choices
+from threading import Thread
+from time import perf_counter
+from werkzeug.serving import make_server, WSGIRequestHandler
+from api import app, db
+from api.admission import controller
+from api.models import User
+from misc_functions import percentile
+
+# The default mix of requests, as relative weights.
+DEFAULT_MIX = {
+    "GET /entry":       50,
+    "POST /entry":      20,
+    "DELETE /entry":    10,
+    "GET /list":        20,
+}
+# Number of entries each user posts before the run, so there's something to
+# GET and DELETE from the start.
+SEED_ENTRIES = 5
+
+
+def parse_mix(text: str) -> dict:
+    """Parse a mix like "GET /entry=50,GET /list=20" into a dict."""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.rpartition('=')
+        method, path = name.split()
+        name = f"{method.upper()} {path}"
+        if name not in DEFAULT_MIX:
+            raise ValueError(
+                f"Unknown endpoint {name!r}, expected one of "
+                f"{', '.join(DEFAULT_MIX)}."
+            )
+        mix[name] = float(weight)
+    return mix
+
+
+def create_users(count: int) -> list:
+    """Create 'count' users, returning their (uid, token) pairs."""
+    users = []
+
+    def commit(token: bytes, user: User):
+        db.session.add(user)
+        db.session.commit()
+        users.append((user.identifier, token.decode('ascii')))
+    try:
+        with app.app_context():
+            for i in range(count):
+                user = User(f"loadgen user {i}")
+                user.new_token(commit, user=user)
+    except BaseException:
+        delete_users(users)
+        raise
+    return users
+
+
+def delete_users(users: list):
+    """Delete the users made by create_users, along with their entries."""
+    with app.app_context():
+        for uid, _ in users:
+            user = db.session.get(User, uid)
+            if user is not None:
+                user.delete()
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """A request handler which doesn't log every request."""
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def start_server(host: str, port: int):
+    """Serve the app from a daemon thread, returning the server."""
+    server = make_server(
+        host, port, app, threaded=True, request_handler=QuietRequestHandler
+    )
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def http_request(
+            host: str,
+            port: int,
+            method: str,
+            path: str,
+            headers: dict,
+            body: bytes=b''
+        ) -> tuple:
+    """Make one HTTP/1.1 request, returning the status and body."""
+    reader, writer = await asyncio.open_connection(host, port)
+    head = [f"{method} {path} HTTP/1.1", f"Host: {host}:{port}"]
+    head += [f"{key}: {value}" for key, value in headers.items()]
+    head += [f"Content-Length: {len(body)}", "Connection: close", "", ""]
+    writer.write('\r\n'.join(head).encode('latin-1') + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status_line, _, rest = response.partition(b'\r\n')
+    _, _, response_body = rest.partition(b'\r\n\r\n')
+    return int(status_line.split()[1]), response_body
+
+
+class LoadGenerator:
+    """Drives requests at a server and records their latencies."""
+
+    def __init__(self, host: str, port: int, users: list, mix: dict):
+        self.host = host
+        self.port = port
+        self.users = users
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        # known entry identifiers, for GET and DELETE requests.
+        self.entries = []
+        self.reset()
+
+    def reset(self):
+        """Forget the latencies and statuses recorded so far."""
+        self.latencies = {name: [] for name in DEFAULT_MIX}
+        self.statuses = {name: {} for name in DEFAULT_MIX}
+
+    async def request(self, name: str):
+        """Make one request of the named kind and record how it went."""
+        method, path = name.split(' ')
+        uid, token = choice(self.users)
+        headers = {'uid': uid, 'token': token}
+        body = b''
+        if path == '/entry':
+            if method == 'POST':
+                body = b"load generator item"
+            elif self.entries:
+                headers['elementid'] = choice(self.entries)
+            else:
+                headers['elementid'] = -1
+        start = perf_counter()
+        try:
+            status, response = await http_request(
+                self.host, self.port, method, path, headers, body
+            )
+        except OSError:
+            status, response = 0, b''
+        elapsed = perf_counter() - start
+        self.latencies[name].append(elapsed)
+        self.statuses[name][status] = self.statuses[name].get(status, 0) + 1
+        if method == 'POST' and status == 200:
+            self.entries.append(fromJSONtext(response)['identifier'])
+        elif method == 'DELETE' and status == 200:
+            try:
+                self.entries.remove(headers['elementid'])
+            except ValueError:
+                pass
+
+    def next_name(self) -> str:
+        return choices(self.names, self.weights)[0]
+
+    async def closed_loop(self, concurrency: int, duration: float):
+        """Run 'concurrency' clients, each sending requests back to back."""
+        deadline = perf_counter() + duration
+
+        async def client():
+            while perf_counter() < deadline:
+                await self.request(self.next_name())
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    async def open_loop(self, rate: float, duration: float):
+        """Start 'rate' requests per second, however long they take."""
+        start = perf_counter()
+        tasks = []
+        sent = 0
+        while perf_counter() - start < duration:
+            due = start + sent / rate
+            delay = due - perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(
+                self.request(self.next_name())
+            ))
+            sent += 1
+        await asyncio.gather(*tasks)
+
+    def report(self, elapsed: float) -> dict:
+        """Throughput and latency percentiles, in milliseconds, per kind."""
+        endpoints = {}
+        for name in self.names:
+            latencies = sorted(
+                latency * 1000 for latency in self.latencies[name]
+            )
+            endpoints[name] = {
+                'requests':     len(latencies),
+                'throughput':   len(latencies) / elapsed,
+                'statuses':     {
+                    str(status): count
+                    for status, count in self.statuses[name].items()
+                },
+                'p50':          percentile(latencies, 50),
+                'p95':          percentile(latencies, 95),
+                'p99':          percentile(latencies, 99),
+                'max':          latencies[-1] if latencies else 0.0,
+            }
+        total = sum(each['requests'] for each in endpoints.values())
+        return {
+            'duration':     elapsed,
+            'requests':     total,
+            'throughput':   total / elapsed,
+            'endpoints':    endpoints,
+        }
+
+
+def run(
+            users: int=10,
+            duration: float=10.0,
+            concurrency: int=10,
+            rate: float=0.0,
+            mix: dict=None,
+            host: str="127.0.0.1",
+            port: int=0,
+            rate_limit: bool=False
+        ) -> dict:
+    """Start a server, run the load against it, and return the report.
+
+    If 'rate' is given, requests are started at that rate, otherwise
+    'concurrency' clients send requests as fast as they can. A port of 0
+    picks any free one. Rate limiting is turned off for the run unless
+    'rate_limit' is set, since every request comes from the same address.
+    Admission control stays on; the report includes its counters, so the
+    number of requests shed with 503 can be seen. The users made for the
+    run are deleted afterwards, with all their entries.
+    """
+    app.config['RATE_LIMIT_ENABLED'] = rate_limit
+    server = start_server(host, port)
+    created = []
+    try:
+        created = create_users(users)
+        generator = LoadGenerator(
+            host, server.server_port, created, mix or DEFAULT_MIX
+        )
+        loop = asyncio.new_event_loop()
+        try:
+            for _ in range(SEED_ENTRIES * users):
+                loop.run_until_complete(generator.request("POST /entry"))
+            generator.reset()
+            start = perf_counter()
+            if rate:
+                loop.run_until_complete(generator.open_loop(rate, duration))
+            else:
+                loop.run_until_complete(
+                    generator.closed_loop(concurrency, duration)
+                )
+            report = generator.report(perf_counter() - start)
+            report['admission'] = controller.metrics()
+            return report
+        finally:
+            loop.close()
+    finally:
+        server.shutdown()
+        delete_users(created)
@@ -3,11 +3,15 @@
 Each class defines a table in the relational database.
 """
 from api import db      # Model, Column, Integer, String, ForeignKey
+from api.tokens import check_token_hash, hash_token, needs_rehash
 from config import Config
 from flask_login import UserMixin
-from werkzeug.security import check_password_hash, generate_password_hash
+from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
-from misc_functions import get_entropy
+from textwrap import dedent
+from threading import Lock
+from misc_functions import get_entropy, snowflake_ids, SNOWFLAKE_NODE_BITS
+from os import getpid
 from json import dumps
 from typing import Callable, Optional, Any, Union
 from strict_hint import strict
@@ -50,59 +54,122 @@ class User(UserMixin, db.Model):
         if callback is None:
             callback = print
         token = get_entropy(self.config.ENTROPY_BITS)
-        self.token_hash = generate_password_hash(token)
+        self.token_hash = hash_token(token)
+        if self.identifier is not None:
+            # revoke the sessions issued for the old token.
+            from api.sessions import note_token_hash
+            note_token_hash(self.identifier, self.token_hash)
         return callback(token, *cbargs, **cbkwargs)
 
     @strict
     def check_token(self, token: bytes) -> bool:
-        """Check if the given token matches the stored hash."""
-        return True if check_password_hash(
-            self.token_hash, token
-        ) else False
+        """Check if the given token matches the stored hash.
+
+        If it does, but the hash was made by a scheme other than
+        Config.TOKEN_HASH_METHOD, the token is hashed again with that one
+        and saved. See api.tokens.
+        """
+        if not check_token_hash(self.token_hash, token):
+            return False
+        if self.identifier is not None and needs_rehash(self.token_hash):
+            self.token_hash = hash_token(token)
+            try:
+                db.session.commit()
+            except SQLAlchemyError:
+                # try again next time.
+                db.session.rollback()
+        return True
 
     @strict
     def get_id(self) -> int:
         """Required by flask_login."""
         return self.identifier
 
-    def delete(self, instance=None):
-        """Delete a User by its ID or the User object itself.
+    def delete(self, instance=None, batch_size: int=None) -> int:
+        """Delete a User and their entries, by its ID or the User object itself.
 
         Instance can be an integer representing a User row primary key, a User
         object, or be unspecified. If it's unspecified, this method will
         attempt to delete the object it is a member of from the database.
+
+        The user's entries, archived or not, are deleted first, through the
+        storage engine (see Storage.delete_by_author), in batches of up to
+        'batch_size' (Config.DELETE_BATCH_SIZE by default) so that deleting
+        a prolific author doesn't hold the database's write lock for long.
+        Returns the number of entries deleted.
         """
         if isinstance(instance, int):
-            # query by ID value
-            self.query.get(instance).delete()
+            identifier = instance
         elif isinstance(instance, type(self)):
-            # query by User's 'identifier' attribute
+            # delete by User's 'identifier' attribute
             if instance.identifier is None:
                 print(
                     f"User {instance} hasn't been committed yet, no need to "
                     "delete."
                 )
-                return
-            self.query.get(instance.identifier).delete()
+                return 0
+            identifier = instance.identifier
         elif instance is None:
-            # call again with this object's identifier.
-            self.delete(self.identifier)
+            # call again with this object.
+            return self.delete(self, batch_size)
         else:
             raise TypeError(dedent(f"""
                 Instance {instance} should be int or User if specified,
                 got {type(instance)}."""))
+        if batch_size is None:
+            batch_size = Config.DELETE_BATCH_SIZE
+        from api.storage import get_storage
+        deleted = get_storage().delete_by_author(identifier, batch_size)
+        User.query.filter_by(identifier=identifier).delete()
+        db.session.commit()
+        return deleted
+
+
+# (PID, generator), made again in a forked child so it gets its own node.
+_identifiers = (None, None)
+_identifiers_lock = Lock()
+
+
+def snowflake_node() -> int:
+    """This process's SNOWFLAKE_NODE, by default its PID modulo 1024."""
+    if Config.SNOWFLAKE_NODE is not None:
+        return Config.SNOWFLAKE_NODE
+    return getpid() % (1 << SNOWFLAKE_NODE_BITS)
+
+
+def new_identifier() -> int:
+    """A new, time-ordered, ListEntry identifier.
+
+    Identifiers are snowflake IDs (see misc_functions.snowflake), so they
+    can be made without asking the database, and sort in the order the
+    entries were created. Each process serving the API needs its own
+    node (see snowflake_node) for them to be unique.
+    """
+    global _identifiers
+    with _identifiers_lock:
+        pid, identifiers = _identifiers
+        if pid != getpid():
+            identifiers = snowflake_ids(snowflake_node())
+            _identifiers = (getpid(), identifiers)
+        return next(identifiers)
 
 
 class ListEntry(db.Model):
     """An individual item in a list, and its associated attributes."""
-    identifier      = db.Column(db.Integer, primary_key=True)
+    identifier      = db.Column(db.BigInteger, primary_key=True,
+                                autoincrement=False)
     content         = db.Column(db.String(length=256))
     author          = db.Column(db.Integer, db.ForeignKey("user.identifier"))
-    creation_time   = db.Column(db.Integer)
+    creation_time   = db.Column(db.Float, index=True)
 
     @strict
-    def __init__(self, content: str, author: int):
-        """Create a new entry in this table."""
+    def __init__(self, content: str, author: int, identifier: int=None):
+        """Create a new entry in this table.
+
+        If an identifier isn't given, a new one is made by new_identifier.
+        """
+        self.identifier = new_identifier() if identifier is None \
+            else identifier
         self.creation_time = datetime.now().timestamp()
         self.content = content
         self.author = author
@@ -128,29 +195,80 @@ class ListEntry(db.Model):
             'creation_time':    self.creation_time
         })
 
-    def delete(self, instance=None):
+    @property
+    @strict
+    def row(self) -> tuple:
+        """The attributes as a tuple, in the order of api.wire.ENTRY_FIELDS."""
+        return (
+            self.identifier, self.content, self.author, self.creation_time
+        )
+
+    def delete(self, instance=None) -> bool:
         """Delete a ListEntry by its ID or the ListEntry object itself.
 
-        Instance can be an integer representing a User row primary key, a
+        Instance can be an integer representing a ListEntry row primary key, a
         ListEntry object, or be unspecified. If it's unspecified, this method
         will attempt to delete the object it is a member of from the database.
+
+        The entry is deleted through the storage engine, or from the archive
+        table if it's been archived. Returns False if there was no such
+        entry.
         """
         if isinstance(instance, int):
-            # query by ID value
-            self.query.get(instance).delete()
+            identifier = instance
         elif isinstance(instance, type(self)):
-            # query by User's 'identifier' attribute
+            # delete by the entry's 'identifier' attribute
             if instance.identifier is None:
                 print(
-                    f"User {instance} hasn't been committed yet, no need to "
-                    "delete."
+                    f"ListEntry {instance} hasn't been committed yet, no "
+                    "need to delete."
                 )
-                return
-            self.query.get(instance.identifier).delete()
+                return False
+            identifier = instance.identifier
         elif instance is None:
-            # call again with this object's identifier.
-            self.delete(self.identifier)
+            # call again with this object.
+            return self.delete(self)
         else:
             raise TypeError(dedent(f"""
                 Instance {instance.__repr__()} should be int or ListEntry if
                 specified, got {type(instance)}."""))
+        from api.storage import get_storage
+        if get_storage().delete(identifier):
+            return True
+        archive = ArchivedListEntry.__table__
+        deleted = db.session.execute(
+            archive.delete().where(archive.c.identifier == identifier)
+        ).rowcount
+        db.session.commit()
+        return deleted > 0
+
+
+class ArchivedListEntry(db.Model):
+    """A ListEntry which has been moved out of the list_entry table.
+
+    Entries older than Config.ARCHIVE_AFTER are moved here by
+    api.archive.archive_old_entries, keeping their identifiers, so that
+    the list_entry table only holds recent entries.
+    """
+    __tablename__ = "list_entry_archive"
+    identifier      = db.Column(db.BigInteger, primary_key=True,
+                                autoincrement=False)
+    content         = db.Column(db.String(length=256))
+    author          = db.Column(db.Integer, db.ForeignKey("user.identifier"))
+    creation_time   = db.Column(db.Float)
+
+
+class IdempotentResponse(db.Model):
+    """The response to a POST made with an Idempotency-Key header.
+
+    Only used when Config.IDEMPOTENCY_TABLE is set, so that every process
+    serving the API can replay the response. See api.idempotency.
+    """
+    uid             = db.Column(db.Integer, primary_key=True,
+                                autoincrement=False)
+    key             = db.Column(db.String(length=64), primary_key=True)
+    fingerprint     = db.Column(db.String(length=64))
+    status          = db.Column(db.Integer)
+    content_type    = db.Column(db.String(length=64))
+    body            = db.Column(db.LargeBinary)
+    expires         = db.Column(db.Float, index=True)
@@ -0,0 +1,125 @@
+"""Export and import the database as newline-delimited JSON.
+
+Each line of an export is one row:
+    {"table": "user", "row": {"identifier": 1, ...}}
+Tables are written in the order of TABLES, so rows are always imported
+after the rows they refer to.
+
+Exports read through a server-side cursor where the database supports one,
+and imports insert in chunks with one transaction each, so neither holds
+more than a chunk of rows in memory. An import records how many lines it
+has committed in a checkpoint file, and picks up from there if it's run
+again after being interrupted. Since the checkpoint can't be written in the
+same transaction as the chunk, rows whose primary key is already in the
+database are skipped rather than inserted, so a chunk which was committed
+just before a crash is harmless to insert again.
+
+Primary keys are copied as they are. When importing into a database with
+sequences (e.g. PostgreSQL) they need to be moved past the imported keys
+afterwards.
+"""
+from json import dumps as toJSONtext, loads as fromJSONtext
+from os import replace
+from os.path import exists
+from api import db
+from api.models import User, ListEntry, ArchivedListEntry
+
+TABLES = [User.__table__, ListEntry.__table__, ArchivedListEntry.__table__]
+
+
+def export_rows(stream, batch_size: int=1000) -> int:
+    """Write every row of every table to stream, returning the row count."""
+    count = 0
+    connection = db.session.connection().execution_options(
+        stream_results=True
+    )
+    for table in TABLES:
+        result = connection.execute(
+            table.select().order_by(*table.primary_key.columns)
+        )
+        keys = list(result.keys())
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                stream.write(toJSONtext({
+                    'table': table.name,
+                    'row': dict(zip(keys, row)),
+                }) + '\n')
+            count += len(rows)
+    return count
+
+
+def insert_new(table):
+    """An INSERT into table which skips rows whose key is already there."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect in ('mysql', 'mariadb'):
+        return table.insert().prefix_with("IGNORE")
+    else:
+        raise NotImplementedError(
+            f"Can't skip existing rows when importing into {dialect}."
+        )
+    return insert(table).on_conflict_do_nothing()
+
+
+def read_checkpoint(path: str) -> int:
+    """The number of lines committed by an earlier import, or 0."""
+    if path and exists(path):
+        with open(path) as file:
+            return int(file.read().strip() or 0)
+    return 0
+
+
+def write_checkpoint(path: str, lines: int):
+    """Record that 'lines' lines have been committed, atomically."""
+    if path:
+        with open(path + ".tmp", 'w') as file:
+            file.write(str(lines))
+        replace(path + ".tmp", path)
+
+
+def import_rows(stream, checkpoint: str=None, chunk_size: int=1000) -> int:
+    """Insert the rows read from stream, returning how many were read.
+
+    Lines before the one recorded in the 'checkpoint' file are skipped,
+    and the file is updated after each chunk is committed. Rows which are
+    already in the database are left as they are.
+    """
+    tables = {table.name: table for table in TABLES}
+    done = read_checkpoint(checkpoint)
+    inserted = 0
+    chunk = {}
+    pending = 0
+    line_number = 0
+
+    def commit():
+        nonlocal pending
+        for table in TABLES:
+            if chunk.get(table.name):
+                db.session.execute(insert_new(table), chunk[table.name])
+        db.session.commit()
+        write_checkpoint(checkpoint, line_number)
+        chunk.clear()
+        pending = 0
+
+    for line_number, line in enumerate(stream, start=1):
+        if line_number <= done or not line.strip():
+            continue
+        record = fromJSONtext(line)
+        if record['table'] not in tables:
+            raise ValueError(
+                f"Line {line_number}: unknown table {record['table']!r}."
+            )
+        chunk.setdefault(record['table'], []).append(record['row'])
+        pending += 1
+        inserted += 1
+        if pending >= chunk_size:
+            commit()
+    if pending:
+        commit()
+    return inserted
@@ -0,0 +1,111 @@
+"""In-memory token-bucket rate limiting.
+
+Buckets are kept per process and keyed by a string such as "uid:3" or
+"addr:127.0.0.1". The limit is checked before any authentication is
+attempted, so a client hammering the API with bad tokens is turned away
+without costing us a key derivation per request.
+"""
+from collections import Counter, OrderedDict
+from threading import Lock
+from time import monotonic
+from math import ceil
+from api import app
+from config import Config
+
+
+class TokenBucket:
+    """A bucket which refills at 'rate' tokens per second up to 'burst'."""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        """A new, full bucket."""
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Try to take a token from the bucket.
+
+        Returns 0 if a token was taken, otherwise the number of seconds until
+        one will be available.
+        """
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """A bounded collection of token buckets, one per key.
+
+    The least recently used buckets are dropped once there are more than
+    'max_keys' of them, so a flood of distinct (probably bogus) uids can't
+    grow the table without bound. A dropped bucket just comes back full.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = Lock()
+
+    def check(self, key: str, now: float=None) -> float:
+        """Take a token for key, returning the wait in seconds if denied."""
+        if now is None:
+            now = monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(
+                    self.rate, self.burst, now
+                )
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+            return bucket.take(now)
+
+
+uid_limiter = RateLimiter(
+    Config.RATE_LIMIT_UID_RATE,
+    Config.RATE_LIMIT_UID_BURST,
+    Config.RATE_LIMIT_MAX_KEYS
+)
+address_limiter = RateLimiter(
+    Config.RATE_LIMIT_ADDRESS_RATE,
+    Config.RATE_LIMIT_ADDRESS_BURST,
+    Config.RATE_LIMIT_MAX_KEYS
+)
+# Number of rejected requests, keyed by "uid" or "address".
+rejected = Counter()
+
+
+def rate_limit_response(uid, address):
+    """Check the limits for a request, before it's authenticated.
+
+    Returns None if the request may proceed, or a (body, status, headers)
+    tuple to be returned from the view if it's been limited.
+    """
+    if not app.config['RATE_LIMIT_ENABLED']:
+        return None
+    wait = address_limiter.check(f"addr:{address}")
+    if wait:
+        rejected['address'] += 1
+    elif uid is not None:
+        wait = uid_limiter.check(f"uid:{uid}")
+        if wait:
+            rejected['uid'] += 1
+    if wait:
+        return (
+            "Too many requests.",
+            429,
+            {'Retry-After': str(max(1, ceil(wait)))}
+        )
+    return None
@@ -1,9 +1,14 @@
 from flask import request as incoming_request, make_response
-from json import dumps as toJSONtext, loads as fromJSONtext
+from json import dumps as toJSONtext
 from strict_hint import strict
 from sqlalchemy.exc import SQLAlchemyError
-from api import app
-from api.models import ListEntry
+from api import app, sessions
+from api.idempotency import idempotent_response, fingerprint_of
+from api.ratelimit import rate_limit_response
+from api.storage import get_storage, EntryExists
+from api.wire import (
+    negotiate, encode_entry, encode_entries, encode_lookup, JSON
+)
 from config import Config
 
 
@@ -20,6 +25,107 @@ def user_is_unauthorized(id: int, token: bytes) -> bool:
     return True
 
 
+def request_is_unauthorized(credentials=None) -> bool:
+    """Check the uid and token, or session, headers of the current request.
+
+    If there's a session header, it's checked as a credential from /session
+    without touching the database. Otherwise the token is checked, with the
+    headers converted to the types user_is_unauthorized expects. A missing
+    or non-numeric uid is treated like any other failed authentication.
+
+    'credentials' may be given to read the values from somewhere other than
+    the headers, such as the query string.
+    """
+    if credentials is None:
+        credentials = incoming_request.headers
+    try:
+        uid = int(credentials.get("uid"))
+    except (TypeError, ValueError):
+        return True
+    if "session" in credentials:
+        return not sessions.is_valid(credentials["session"], uid)
+    return user_is_unauthorized(
+        uid, credentials.get('token', '').encode('utf-8')
+    )
+
+
+def entry_id(text: str) -> int:
+    """An entry ID sent by a client, as an integer.
+
+    Raises ValueError unless it's in the range of the identifier column,
+    0 < ID < 2**63, so that the database is never asked about an ID it
+    can't store.
+    """
+    identifier = int(text)
+    if not 0 < identifier < 2 ** 63:
+        raise ValueError(f"Entry ID {identifier} is out of range.")
+    return identifier
+
+
+def element_id() -> int:
+    """The elementid header of the current request, as an integer."""
+    return entry_id(incoming_request.headers.get("elementid"))
+
+
+def element_ids() -> list:
+    """The comma-separated elementid header, as a list of unique entry IDs."""
+    return list(dict.fromkeys(
+        entry_id(part)
+        for part in incoming_request.headers.get("elementid").split(",")
+        if part.strip()
+    ))
+
+
+def get_entries(storage):
+    """Look up every entry named by the current GET /entry request."""
+    try:
+        identifiers = element_ids()
+    except ValueError:
+        return ("Invalid entry ID.", 400)
+    if len(identifiers) > app.config['GET_MANY_MAX']:
+        return (
+            "Too many entry IDs! Received %d, max %d."
+                % (len(identifiers), app.config['GET_MANY_MAX']),
+            400
+        )
+    rows = storage.get_many(identifiers)
+    found = {row[0] for row in rows}
+    missing = [each for each in identifiers if each not in found]
+    mimetype = negotiate(incoming_request.accept_mimetypes)
+    response = make_response(encode_lookup(rows, missing, mimetype), 200)
+    response.headers['Content-Type'] = mimetype
+    response.vary.add('Accept')
+    return response
+
+
+def add_entry(storage):
+    """Add an entry from the body of the current POST /entry request."""
+    content: str = incoming_request.data.decode(
+        incoming_request.headers.get('encoding') or 'utf-8'
+    )
+    if len(content) > 256:
+        return (
+            "Content is too long! Received %s chars, max 256."
+                % len(content),
+            400
+        )
+    identifier = None
+    if "elementid" in incoming_request.headers:
+        try:
+            identifier = element_id()
+        except ValueError:
+            return ("Invalid entry ID.", 400)
+    try:
+        row = storage.add(
+            content=content,
+            author=int(incoming_request.headers.get("uid")),
+            identifier=identifier
+        )
+    except EntryExists:
+        return ("Entry already exists.", 409)
+    return (encode_entry(row, JSON), 200, {'Content-Type': JSON})
+
+
 @app.route("/entry", methods=["GET", "POST", "DELETE"])
 def entry():
     """Retrieve, create, or delete a list entry for an authenticated user.
@@ -27,12 +133,27 @@ def entry():
     Accepted headers for this endpoint:
     uid:        The user's ID number (their primary key)
     token:      The user's authentication token
-    elementid:  The ID (primary key) of the element to be acted upon.
+    session:    A credential from /session, which may be sent instead of the
+                token.
+    elementid:  The ID (primary key) of the element to be acted upon. For
+                POST requests it's optional: a client may choose the ID of
+                the entry it creates, so that a retried POST can't create
+                the entry twice. See misc_functions.snowflake_ids.
+                For GET requests it may be a comma-separated list of up to
+                GET_MANY_MAX IDs, to look them all up at once (a single ID
+                can be sent as e.g. "3," to get the same response layout).
     json:       If "0", only the content of the specified entry is returned.
                 For any other value, the JSON encoded attributes of the entry
                 is returned. (only applies to GET requests)
+    Accept:     application/msgpack or application/cbor to receive the
+                attributes in that format rather than JSON, if the server
+                supports it. See api.wire.
     encoding:   The text encoding of the content of the POST request. Defaults
                 to UTF-8.
+    Idempotency-Key:
+                Up to 64 characters identifying a POST, to be sent again if
+                it's retried. A retry gets the first response back, without
+                the entry being added again. See api.idempotency.
 
     A POST request can accept a string of up to 256 characters long to be saved
     as the content of the Entry.
@@ -46,89 +167,220 @@ def entry():
             400  -  Malformed request       Descriptive error.
             401  -  User authentication     Lit. "Unauthorized."
                     failed.
+        For a list of IDs, responds 200 with the entries found and the IDs
+        which weren't, encoded as described in api.wire, whatever the
+        'json' header.
     POST:   Creates a new entry with the provided content, authored by the
             authenticated user.
         Responses:
             Same as for get requests, including returning the JSON-encoded (or
             plain-text) content of the submitted entry.
+            409  -  An entry with the       Lit. "Entry already exists."
+                    given elementid
+                    already exists, or a
+                    request with the same
+                    Idempotency-Key is
+                    still in progress.
+            422  -  The Idempotency-Key    Descriptive error.
+                    was used for a
+                    different request.
     DELETE: Deletes the specified row in the database
         Responses:
             200  -  Valid request           Lit. "success"
             400  -  Same as for GET/POST requests.
             401  -  Same as for GET/POST requests.
+
+    Any method may also respond with 429 ("Too many requests.") and a
+    Retry-After header if the client's uid or address is being rate limited.
+
+    Entry IDs are up to 2**63 - 1, more than a double holds exactly, so
+    JSON clients must read them as 64-bit or big integers. See api.wire.
     """
-    if user_is_unauthorized(             # WARNING: this block must come first!
-                int(incoming_request.headers.get("uid")),
-                incoming_request.headers.get('token')
-            ):
+    limited = rate_limit_response(
+        incoming_request.headers.get("uid"), incoming_request.remote_addr
+    )
+    if limited:
+        return limited
+    if request_is_unauthorized():   # WARNING: this block must come first!
         return ("Unauthorized", 401)
-    from api import db
-    from api.models import ListEntry
+    storage = get_storage()
     if incoming_request.method == "GET":
+        if "," in incoming_request.headers.get("elementid", ""):
+            return get_entries(storage)
         try:
-            if incoming_request.headers.get("json") == "0":
-                response = str(
-                    ListEntry.query.get(
-                        incoming_request.headers.get("elementid")
-                    )
-                )
-                response.headers['Content-Type'] = 'text/plain'
-            else:
-                response = ListEntry.query.get(
-                    incoming_request.headers.get("elementid")
-                ).json
-                response.headers['Content-Type'] = 'application/json'
-        except SQLAlchemyError:
-            response = make_response("Invalid entry ID.", 400)
+            row = storage.get(element_id())
+        except (SQLAlchemyError, ValueError, TypeError):
+            row = None
+        if row is None:
+            return make_response("Invalid entry ID.", 400)
+        if incoming_request.headers.get("json") == "0":
+            response = make_response(row[1], 200)
+            response.headers['Content-Type'] = 'text/plain'
+        else:
+            mimetype = negotiate(incoming_request.accept_mimetypes)
+            response = make_response(encode_entry(row, mimetype), 200)
+            response.headers['Content-Type'] = mimetype
+        response.vary.add('Accept')
         return response
     if incoming_request.method == "POST":
-        content: str = incoming_request.data.decode(
-            incoming_request.headers.get('encoding') or 'utf-8'
-        )
-        if len(content) > 256:
-            return (
-                "Content is too long! Received %s chars, max 256."
-                    % len(content),
-                400
-            )
-        the_entry = ListEntry(
-            content=content,
-            author=incoming_request.headers.get("uid")
+        key = incoming_request.headers.get("Idempotency-Key")
+        if key is None:
+            return add_entry(storage)
+        return idempotent_response(
+            int(incoming_request.headers.get("uid")),
+            key,
+            fingerprint_of(
+                incoming_request.data,
+                incoming_request.headers.get('encoding'),
+                incoming_request.headers.get('elementid')
+            ),
+            lambda: add_entry(storage)
         )
-        db.session.add(the_entry)
-        db.session.commit
-        return (the_entry.json, 200)
     if incoming_request.method == "DELETE":
         try:
-            ListEntry.query.get(
-                incoming_request.headers.get("elementid")
-            ).delete()
-            return ("success", 200)
-        except SQLAlchemyError:
-            return (
-                "Couldn't delete row %s."
-                    % incoming_request.headers.get('elementid'),
-                400
-            )
+            if storage.delete(element_id()):
+                return ("success", 200)
+        except (SQLAlchemyError, ValueError, TypeError):
+            pass
+        return (
+            "Couldn't delete row %s."
+                % incoming_request.headers.get('elementid'),
+            400
+        )
+
+
+@app.route("/session", methods=["POST"])
+def new_session():
+    """Exchange a user's token for a short-lived session credential.
+
+    Takes the same uid and token headers as the other endpoints, and
+    responds with the JSON object
+        {"session": <credential>, "expires": <UNIX timestamp>}
+    The credential can then be sent in a session header, along with the uid
+    header, in place of the token until it expires. Getting a new token
+    revokes it, in every process within SESSION_GENERATION_MAX_AGE seconds.
+    See api.sessions.
+
+    Responds 401 ("Unauthorized") if the token is wrong, or 429 if the
+    client is being rate limited.
+    """
+    limited = rate_limit_response(
+        incoming_request.headers.get("uid"), incoming_request.remote_addr
+    )
+    if limited:
+        return limited
+    from api.models import User
+    try:
+        user = User.query.get(int(incoming_request.headers.get("uid")))
+    except (SQLAlchemyError, TypeError, ValueError):
+        user = None
+    token = incoming_request.headers.get('token', '').encode('utf-8')
+    if user is None or not user.check_token(token):
+        return ("Unauthorized", 401)
+    credential, expires = sessions.issue(user.identifier, user.token_hash)
+    return (
+        toJSONtext({'session': credential, 'expires': expires}),
+        200,
+        {'Content-Type': JSON}
+    )
+
+
+@app.route("/stats")
+def stats():
+    """JSON-encoded statistics about the list.
+
+    Responds with an object of
+        entries:            The number of entries.
+        entries_per_author: The number of entries by each author's uid.
+        additions_per_hour: The number of entries created in each hour,
+                            keyed by the UNIX timestamp of its start.
+        top_items:          [content, count] pairs for the most frequent
+                            contents, most frequent first.
+    The "top" header sets how many top items to list, 10 by default. It
+    mustn't be negative.
+    Authenticated and rate limited like the other endpoints.
+    """
+    limited = rate_limit_response(
+        incoming_request.headers.get("uid"), incoming_request.remote_addr
+    )
+    if limited:
+        return limited
+    if request_is_unauthorized():
+        return ("Unauthorized", 401)
+    try:
+        top = int(incoming_request.headers.get("top", 10))
+    except ValueError:
+        top = -1
+    if top < 0:
+        return ("Invalid top value.", 400)
+    from api.stats import get_columns
+    return (
+        toJSONtext(get_columns().summary(top=top)),
+        200,
+        {'Content-Type': JSON}
+    )
 
 
 @app.route("/list")
 def list_entries():
-    """JSON-encoded list of all database entries and the content."""
-    if user_is_unauthorized(
-                incoming_request.headers.get("uid"),
-                incoming_request.headers.get('token')
-            ):
+    """Encoded list of all database entries and the content.
+
+    The list is JSON-encoded by default. Clients may ask for MessagePack or
+    CBOR through the Accept header, in which case the entries are sent in
+    the columnar layout described in api.wire.
+
+    If the include_archived header is "1", entries which have been moved to
+    the archive table (see api.archive) are included.
+    """
+    limited = rate_limit_response(
+        incoming_request.headers.get("uid"), incoming_request.remote_addr
+    )
+    if limited:
+        return limited
+    if request_is_unauthorized():
         return ("Unauthorized", 401)
+    mimetype = negotiate(incoming_request.accept_mimetypes)
     response = make_response(
-        toJSONtext([
-            fromJSONtext(entry.json) for entry in ListEntry.query.all()
-        ]),
+        encode_entries(
+            get_storage().all(
+                include_archived=incoming_request.headers.get(
+                    "include_archived"
+                ) == "1"
+            ),
+            mimetype
+        ),
         200
     )
-    response.headers['Content-Type'] = 'application/json'
+    response.headers['Content-Type'] = mimetype
+    response.vary.add('Accept')
     return response
 
 
+@app.route("/metrics")
+def metrics():
+    """JSON-encoded counters for monitoring how loaded the server is.
+
+    Responds with an object of
+        admission:      The requests being handled ("active") and waiting
+                        ("queued") in this process, the limits on them, and
+                        the counts of requests admitted and shed (by
+                        reason). See api.admission.
+        rate_limited:   The count of requests rejected by api.ratelimit,
+                        by "uid" or "address".
+    Not authenticated, rate limited or subject to admission control, so it
+    can be read while the server is overloaded. It exposes no list data.
+    """
+    from api.admission import controller
+    from api.ratelimit import rejected
+    return (
+        toJSONtext({
+            'admission': controller.metrics(),
+            'rate_limited': dict(rejected),
+        }),
+        200,
+        {'Content-Type': JSON}
+    )
+
+
 if __name__ == '__main__':
     app.run(port=Config.PUBLISH_PORT)
@@ -0,0 +1,104 @@
+"""Short-lived, signed session credentials.
+
+Checking a user's token means loading the User and running the token hash,
+which is deliberately slow. A client can instead exchange its token once,
+at /session, for a session credential, and send that with later requests.
+A credential looks like
+    uid.expires.generation.signature
+where 'expires' is a UNIX timestamp, 'generation' identifies the token
+hash the user had when the credential was issued, and 'signature' is an
+HMAC-SHA256 of the rest, keyed with the app's SECRET_KEY. Checking it takes
+one HMAC and no database access.
+
+A credential is only accepted if its generation is that of the user's
+current token hash, so getting a new token revokes the credentials issued
+for the old one. Each process caches the current generation of each user
+for up to SESSION_GENERATION_MAX_AGE seconds, looking the token hash up by
+primary key when it has no fresh entry (a cheap query, unlike checking a
+token), so a new token made by another process revokes credentials
+everywhere within that time. Credentials for users who don't exist, or
+can't be looked up, are refused. Credentials are only valid in processes
+sharing the same SECRET_KEY.
+"""
+from hashlib import sha256
+from hmac import new as hmac, compare_digest
+from threading import Lock
+from time import monotonic, time
+from sqlalchemy.exc import SQLAlchemyError
+from api import app, db
+
+# The generation of the latest token hash seen for each uid, and the
+# monotonic time it was seen at.
+current_generation = {}
+_generation_lock = Lock()
+
+
+def generation_of(token_hash: str) -> str:
+    """A short identifier for a token hash."""
+    return sha256(token_hash.encode('utf-8')).hexdigest()[:16]
+
+
+def note_token_hash(uid: int, token_hash: str):
+    """Remember a user's current token hash, revoking older credentials."""
+    with _generation_lock:
+        current_generation[uid] = (generation_of(token_hash), monotonic())
+
+
+def generation_for(uid: int):
+    """The generation of uid's current token hash, or None if there's none.
+
+    Taken from the cache if it's fresh enough, otherwise from the database.
+    """
+    cached = current_generation.get(uid)
+    if cached is not None and monotonic() - cached[1] \
+            < app.config['SESSION_GENERATION_MAX_AGE']:
+        return cached[0]
+    from api.models import User
+    try:
+        user = db.session.get(User, uid)
+    except SQLAlchemyError:
+        db.session.rollback()
+        return None
+    if user is None or not user.token_hash:
+        return None
+    note_token_hash(uid, user.token_hash)
+    return generation_of(user.token_hash)
+
+
+def _signature(payload: str) -> str:
+    key = app.config['SECRET_KEY']
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+    return hmac(key, payload.encode('utf-8'), sha256).hexdigest()
+
+
+def issue(uid: int, token_hash: str, lifetime: int=None) -> tuple:
+    """Issue a credential for a user who has just proven their token.
+
+    Returns the credential and the time it expires. 'lifetime' defaults to
+    the SESSION_LIFETIME config value, in seconds.
+    """
+    if lifetime is None:
+        lifetime = app.config['SESSION_LIFETIME']
+    note_token_hash(uid, token_hash)
+    expires = int(time()) + lifetime
+    payload = f"{uid}.{expires}.{generation_of(token_hash)}"
+    return f"{payload}.{_signature(payload)}", expires
+
+
+def is_valid(credential: str, uid: int) -> bool:
+    """Check that a credential is valid for uid.
+
+    It must have been issued to uid, not have expired, and not have been
+    revoked by the user getting a new token (see generation_for).
+    """
+    try:
+        payload, signature = credential.rsplit('.', 1)
+        issued_to, expires, generation = payload.split('.')
+        if int(issued_to) != uid or int(expires) < time():
+            return False
+    except ValueError:
+        return False
+    if not compare_digest(_signature(payload), signature):
+        return False
+    return generation_for(uid) == generation
@@ -0,0 +1,212 @@
+"""Statistics about the list, for /stats.
+
+The statistics are computed from a columnar copy of the entries kept in
+memory: one array each of identifiers, authors and creation times, and one
+of content ids, indexes into a table of interned content strings. The copy
+is loaded from the storage engine once, then kept up to date by listening
+to the changes made through it. Deleted entries are masked out until
+there are enough of them to be worth rebuilding the arrays. Changes made
+by other processes are picked up by reloading every STATS_MAX_AGE seconds.
+
+When NumPy is installed the aggregations run over the arrays without a
+Python loop. Without it, they're done with SQL GROUP BY queries when the
+entries are in the SQLAlchemy engine, or with collections.Counter over the
+arrays otherwise.
+"""
+from array import array
+from collections import Counter
+from threading import Lock
+from time import monotonic
+from api import app, db
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SECONDS_PER_HOUR = 60 * 60
+
+
+class EntryColumns:
+    """The entries of a storage engine, as arrays."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.lock = Lock()
+        self.load_lock = Lock()
+        self.loaded_at = None
+        # Changes reported while a load is reading the rows, to be applied
+        # to what it read; None when no load is running.
+        self.missed = None
+        storage.add_listener(self.changed)
+
+    def load(self):
+        """(Re)load every entry from storage.
+
+        The rows are read without holding self.lock, so that changes can
+        still be reported meanwhile; those are applied to the new arrays
+        once they're built.
+        """
+        with self.load_lock:
+            with self.lock:
+                self.missed = []
+            rows = self.storage.all()
+            with self.lock:
+                self.identifiers = array('q')
+                self.authors = array('q')
+                self.times = array('d')
+                self.contents = array('q')
+                self.alive = array('b')
+                self.positions = {}
+                self.strings = []
+                self.string_ids = {}
+                self.deleted = 0
+                for row in rows:
+                    self._append(row)
+                self.loaded_at = monotonic()
+                missed, self.missed = self.missed, None
+                for added, deleted in missed:
+                    self._apply(added, deleted)
+
+    def _intern(self, content: str) -> int:
+        string_id = self.string_ids.get(content)
+        if string_id is None:
+            string_id = self.string_ids[content] = len(self.strings)
+            self.strings.append(content)
+        return string_id
+
+    def _append(self, row: tuple):
+        identifier, content, author, creation_time = row
+        self.positions[identifier] = len(self.identifiers)
+        self.identifiers.append(identifier)
+        self.authors.append(author or 0)
+        self.times.append(creation_time or 0)
+        self.contents.append(self._intern(content or ''))
+        self.alive.append(1)
+
+    def changed(self, added: tuple=None, deleted: int=None):
+        """Apply a change reported by the storage engine."""
+        with self.lock:
+            if self.missed is not None:
+                self.missed.append((added, deleted))
+            if self.loaded_at is not None:
+                self._apply(added, deleted)
+
+    def _apply(self, added: tuple, deleted: int):
+        # an entry added while load() ran may already have been read.
+        if added is not None and added[0] not in self.positions:
+            self._append(added)
+        if deleted is not None:
+            position = self.positions.pop(deleted, None)
+            if position is not None:
+                self.alive[position] = 0
+                self.deleted += 1
+        if self.deleted > len(self.identifiers) // 2:
+            # rebuild the arrays on the next refresh, rather than making
+            # the writer wait for it.
+            self.loaded_at = None
+
+    def refresh(self):
+        """Load the entries if they're missing or older than STATS_MAX_AGE."""
+        loaded_at = self.loaded_at
+        if loaded_at is None \
+                or monotonic() - loaded_at > app.config['STATS_MAX_AGE']:
+            self.load()
+
+    def summary(self, top: int=10) -> dict:
+        """Entries per author, additions per hour and the top items."""
+        from api.storage.sql import SQLAlchemyStorage
+        if numpy is None and isinstance(self.storage, SQLAlchemyStorage):
+            return sql_summary(top)
+        self.refresh()
+        with self.lock:
+            if numpy is not None:
+                return self._numpy_summary(top)
+            return self._counter_summary(top)
+
+    def _numpy_summary(self, top: int) -> dict:
+        alive = numpy.frombuffer(self.alive, dtype=numpy.int8).astype(bool)
+        authors = numpy.frombuffer(self.authors, dtype=numpy.int64)[alive]
+        hours = (
+            numpy.frombuffer(self.times, dtype=numpy.float64)[alive]
+            // SECONDS_PER_HOUR
+        ).astype(numpy.int64) * SECONDS_PER_HOUR
+        contents = numpy.frombuffer(self.contents, dtype=numpy.int64)[alive]
+        by_author, author_counts = numpy.unique(authors, return_counts=True)
+        by_hour, hour_counts = numpy.unique(hours, return_counts=True)
+        item_counts = numpy.bincount(contents, minlength=len(self.strings))
+        # most frequent first, ties broken by which was seen first.
+        most = numpy.argsort(-item_counts, kind='stable')[:top]
+        return {
+            'entries': int(alive.sum()),
+            'entries_per_author': dict(zip(
+                by_author.tolist(), author_counts.tolist()
+            )),
+            'additions_per_hour': dict(zip(
+                by_hour.tolist(), hour_counts.tolist()
+            )),
+            'top_items': [
+                [self.strings[i], int(item_counts[i])]
+                for i in most.tolist() if item_counts[i]
+            ],
+        }
+
+    def _counter_summary(self, top: int) -> dict:
+        living = [i for i, alive in enumerate(self.alive) if alive]
+        items = Counter(self.contents[i] for i in living)
+        return {
+            'entries': len(living),
+            'entries_per_author': dict(sorted(Counter(
+                self.authors[i] for i in living
+            ).items())),
+            'additions_per_hour': dict(sorted(Counter(
+                int(self.times[i] // SECONDS_PER_HOUR) * SECONDS_PER_HOUR
+                for i in living
+            ).items())),
+            'top_items': [
+                [self.strings[string_id], count]
+                for string_id, count in items.most_common(top)
+            ],
+        }
+
+
+def sql_summary(top: int) -> dict:
+    """The same statistics as EntryColumns.summary, from GROUP BY queries."""
+    from api.models import ListEntry
+    hour = (
+        db.cast(ListEntry.creation_time / SECONDS_PER_HOUR, db.Integer)
+        * SECONDS_PER_HOUR
+    )
+    count = db.func.count(ListEntry.identifier)
+    return {
+        'entries': db.session.query(count).scalar(),
+        'entries_per_author': dict(
+            db.session.query(ListEntry.author, count)
+            .group_by(ListEntry.author).order_by(ListEntry.author)
+        ),
+        'additions_per_hour': dict(
+            db.session.query(hour, count).group_by(hour).order_by(hour)
+        ),
+        'top_items': [
+            list(row) for row in
+            db.session.query(ListEntry.content, count)
+            .group_by(ListEntry.content)
+            .order_by(count.desc(), db.func.min(ListEntry.identifier))
+            .limit(top)
+        ],
+    }
+
+
+_columns = None
+_columns_lock = Lock()
+
+
+def get_columns() -> EntryColumns:
+    """The columnar cache for the app's storage engine."""
+    global _columns
+    if _columns is None:
+        from api.storage import get_storage
+        with _columns_lock:
+            if _columns is None:
+                _columns = EntryColumns(get_storage())
+    return _columns
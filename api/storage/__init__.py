@@ -0,0 +1,135 @@
+"""Storage engines for list entries.
+
+The routes don't talk to the database directly, they go through the engine
+returned by get_storage(), which is chosen by the STORAGE_ENGINE config
+value:
+    "sqlalchemy"    The ListEntry table, through Flask-SQLAlchemy. This is
+                    the default.
+    "appendlog"     An append-only log file with a memory-mapped index, for
+                    small single-node deployments that don't need SQL at all.
+                    See api.storage.appendlog.
+    "sharded"       SHARD_COUNT SQLite files, with entries sent to one by
+                    their author, so that writes by different authors don't
+                    wait on each other. See api.storage.sharded.
+
+Users are always stored through SQLAlchemy, only list entries go through
+the storage engine.
+
+Entries are passed around as row tuples, in the order given by
+api.wire.ENTRY_FIELDS: (identifier, content, author, creation_time).
+Every engine uses the same time-ordered identifiers, made by
+api.models.new_identifier or chosen by the client.
+"""
+from threading import Lock
+from api import app
+
+
+class EntryExists(ValueError):
+    """Raised when adding an entry with an identifier that's been used."""
+
+
+class Storage:
+    """The interface each storage engine implements."""
+
+    # Incremented by every change made through this instance, so that caches
+    # built from its rows can tell when they're out of date. Changes made
+    # by other processes aren't counted.
+    version = 0
+    listeners = ()
+
+    def add_listener(self, listener):
+        """Call listener(added, deleted) after each change.
+
+        'added' is the row of a new entry, or None; 'deleted' is the
+        identifier of a deleted entry, or None.
+        """
+        self.listeners = [*self.listeners, listener]
+
+    def changed(self, added: tuple=None, deleted: int=None):
+        """Note that an entry has been added or deleted.
+
+        Engines must call this without holding any lock of their own, since
+        listeners may read from the engine.
+        """
+        self.version += 1
+        for listener in self.listeners:
+            listener(added, deleted)
+
+    def get(self, identifier: int):
+        """The row with the given identifier, or None if there isn't one."""
+        raise NotImplementedError
+
+    def get_many(self, identifiers: list) -> list:
+        """The rows with any of the given identifiers, ordered by identifier.
+
+        Identifiers without an entry are left out. Engines override this to
+        look them all up at once.
+        """
+        rows = (self.get(identifier) for identifier in set(identifiers))
+        return sorted(row for row in rows if row is not None)
+
+    def all(self, include_archived: bool=False) -> list:
+        """A list of all the rows, ordered by identifier.
+
+        If 'include_archived' is set, entries which have been archived are
+        included too, for engines which archive entries.
+        """
+        raise NotImplementedError
+
+    def add(self, content: str, author: int, identifier: int=None) -> tuple:
+        """Store a new entry, returning its row.
+
+        The entry is given a new identifier by api.models.new_identifier,
+        unless the client chose one. Raises EntryExists if there's already
+        an entry with the chosen identifier.
+        """
+        raise NotImplementedError
+
+    def delete(self, identifier: int) -> bool:
+        """Delete an entry, returning False if there was nothing to delete."""
+        raise NotImplementedError
+
+    def delete_by_author(self, author: int, batch_size: int) -> int:
+        """Delete every entry by an author, returning how many were deleted.
+
+        Archived entries are deleted too. Entries are deleted up to
+        'batch_size' at a time, each batch by itself, so that deleting a
+        prolific author doesn't keep other writers waiting for long, and
+        changed() is called for each entry deleted.
+        """
+        raise NotImplementedError
+
+
+_engine = None
+_engine_lock = Lock()
+
+
+def create_storage(name: str) -> Storage:
+    """Create a new instance of the named storage engine."""
+    if name == "sqlalchemy":
+        from api.storage.sql import SQLAlchemyStorage
+        return SQLAlchemyStorage()
+    if name == "appendlog":
+        from api.storage.appendlog import AppendLogStorage
+        return AppendLogStorage(
+            app.config['APPEND_LOG_PATH'],
+            compact_ratio=app.config['APPEND_LOG_COMPACT_RATIO'],
+            fsync=app.config['APPEND_LOG_FSYNC']
+        )
+    if name == "sharded":
+        from api.storage.sharded import ShardedStorage
+        return ShardedStorage([
+            app.config['SHARD_PATH_TEMPLATE'].format(number)
+            for number in range(app.config['SHARD_COUNT'])
+        ], chunk_size=app.config['GET_MANY_CHUNK_SIZE'])
+    raise ValueError(f"Unknown storage engine {name!r}.")
+
+
+def get_storage() -> Storage:
+    """The storage engine configured for the app, created on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_storage(app.config['STORAGE_ENGINE'])
+    return _engine
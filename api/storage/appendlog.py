@@ -0,0 +1,387 @@
+"""An append-only log storage engine with a memory-mapped index.
+
+Every change is appended to the log file as a record:
+    op              1 byte, ADD or DELETE
+    identifier      8 bytes, signed
+    author          8 bytes, signed
+    creation_time   8 bytes, double
+    length          4 bytes, unsigned length of the content
+    content         'length' bytes of UTF-8
+all little-endian. DELETE records have no content.
+
+Next to the log is an index file (the log's path with ".idx" appended),
+which is memory mapped. It starts with a header:
+    magic           4 bytes, b"SLI2"
+    log_length      8 bytes, length of the log the index is valid for
+    count           8 bytes, number of slots in use
+    dead_bytes      8 bytes, bytes in the log belonging to deleted entries
+followed by 'count' slots of (identifier, offset) pairs, sorted by
+identifier so that lookups are a binary search. A deleted entry's offset is
+set to -1 until the next compaction drops it. An index with another magic,
+such as one written by an older version, is rebuilt from the log.
+
+The log is written before the index, so if the process dies between the two
+the log_length in the index won't match the log and the index is rebuilt
+from the log when it's next opened. A partially written record at the end
+of the log is truncated away at the same time.
+
+Once the deleted entries take up more than 'compact_ratio' times the space
+of the live ones, the live entries are copied to a new log, which replaces
+the old one along with a new index.
+
+This engine is for a single process; nothing stops two processes from
+writing to the same log.
+"""
+from os import fsync as os_fsync, fstat, pread, replace, remove
+from os.path import exists
+from mmap import mmap
+from struct import Struct
+from threading import Lock
+from datetime import datetime
+from api.models import new_identifier
+from api.storage import EntryExists, Storage
+
+RECORD = Struct('<BqqdI')
+ADD, DELETE = 1, 2
+HEADER = Struct('<4sqqq')
+MAGIC = b'SLI2'
+SLOT = Struct('<qq')
+MIN_CAPACITY = 64
+
+
+class AppendLogStorage(Storage):
+    """Store entries in an append-only log file.
+
+    'compact_ratio' is how many times the live data the dead data may grow
+    to before the log is compacted, and no compaction happens until there
+    are at least 'min_compact_bytes' of dead data. If 'fsync' is set, every
+    write is synced to disk before returning.
+    """
+
+    def __init__(
+                self,
+                path: str,
+                compact_ratio: float=1.0,
+                fsync: bool=False,
+                min_compact_bytes: int=64 * 1024
+            ):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.compact_ratio = compact_ratio
+        self.fsync = fsync
+        self.min_compact_bytes = min_compact_bytes
+        self.lock = Lock()
+        self._open()
+
+    # -- file handling -----------------------------------------------------
+
+    def _open(self):
+        """Open the log and its index, rebuilding the index if it's stale."""
+        self.log = open(self.path, 'a+b')
+        self.log_length = fstat(self.log.fileno()).st_size
+        fresh = not exists(self.index_path)
+        self.index_file = open(self.index_path, 'w+b' if fresh else 'r+b')
+        if fresh or fstat(self.index_file.fileno()).st_size < HEADER.size:
+            self._map_index(MIN_CAPACITY)
+            self._rebuild()
+            return
+        self._map_index()
+        magic, log_length, self.count, self.dead_bytes = \
+            HEADER.unpack_from(self.index, 0)
+        if magic != MAGIC or log_length != self.log_length:
+            self._rebuild()
+
+    def _map_index(self, capacity: int=0):
+        """(Re)map the index file, growing it to hold 'capacity' slots."""
+        if getattr(self, 'index', None) is not None:
+            self.index.close()
+        size = HEADER.size + capacity * SLOT.size
+        if fstat(self.index_file.fileno()).st_size < size:
+            self.index_file.truncate(size)
+        self.index = mmap(self.index_file.fileno(), 0)
+        self.capacity = (len(self.index) - HEADER.size) // SLOT.size
+
+    def _write_header(self):
+        HEADER.pack_into(
+            self.index, 0, MAGIC, self.log_length, self.count, self.dead_bytes
+        )
+
+    def _sync(self):
+        """Flush the log, and the index, to disk if configured to."""
+        self.log.flush()
+        if self.fsync:
+            os_fsync(self.log.fileno())
+            self.index.flush()
+
+    def close(self):
+        """Close the log and index files."""
+        with self.lock:
+            self.index.flush()
+            self.index.close()
+            self.index = None
+            self.index_file.close()
+            self.log.close()
+
+    # -- the index ---------------------------------------------------------
+
+    def _slot(self, position: int) -> tuple:
+        return SLOT.unpack_from(
+            self.index, HEADER.size + position * SLOT.size
+        )
+
+    def _find(self, identifier: int) -> int:
+        """The position of identifier in the index, or where it would go."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._slot(middle)[0] < identifier:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _lookup(self, identifier: int):
+        """The position and offset of a live entry, or None."""
+        position = self._find(identifier)
+        if position < self.count:
+            found, offset = self._slot(position)
+            if found == identifier and offset >= 0:
+                return position, offset
+        return None
+
+    def _insert(self, identifier: int, offset: int):
+        """Point the index at a new record for identifier."""
+        position = self._find(identifier)
+        if position < self.count and self._slot(position)[0] == identifier:
+            SLOT.pack_into(
+                self.index, HEADER.size + position * SLOT.size,
+                identifier, offset
+            )
+            return
+        if self.count == self.capacity:
+            self._map_index(max(MIN_CAPACITY, self.capacity * 2))
+        start = HEADER.size + position * SLOT.size
+        self.index.move(
+            start + SLOT.size, start, (self.count - position) * SLOT.size
+        )
+        SLOT.pack_into(self.index, start, identifier, offset)
+        self.count += 1
+
+    def _rebuild(self):
+        """Rebuild the index by scanning the whole log."""
+        self.count = 0
+        self.dead_bytes = 0
+        offset = 0
+        while offset + RECORD.size <= self.log_length:
+            op, identifier, _, _, length = RECORD.unpack(
+                pread(self.log.fileno(), RECORD.size, offset)
+            )
+            end = offset + RECORD.size + length
+            if end > self.log_length:
+                break
+            if op == ADD:
+                self._insert(identifier, offset)
+            elif op == DELETE:
+                found = self._lookup(identifier)
+                if found is not None:
+                    self.dead_bytes += self._record_size(found[1])
+                    SLOT.pack_into(
+                        self.index, HEADER.size + found[0] * SLOT.size,
+                        identifier, -1
+                    )
+                self.dead_bytes += end - offset
+            offset = end
+        if offset != self.log_length:
+            # a partial record was left by an interrupted write.
+            self.log.truncate(offset)
+            self.log_length = offset
+        self._write_header()
+
+    # -- the log -----------------------------------------------------------
+
+    def _record_size(self, offset: int) -> int:
+        length = RECORD.unpack(
+            pread(self.log.fileno(), RECORD.size, offset)
+        )[4]
+        return RECORD.size + length
+
+    def _author(self, offset: int) -> int:
+        return RECORD.unpack(
+            pread(self.log.fileno(), RECORD.size, offset)
+        )[2]
+
+    def _read(self, offset: int) -> tuple:
+        """The row stored in the ADD record at offset."""
+        _, identifier, author, creation_time, length = RECORD.unpack(
+            pread(self.log.fileno(), RECORD.size, offset)
+        )
+        content = pread(
+            self.log.fileno(), length, offset + RECORD.size
+        ).decode('utf-8')
+        return (identifier, content, author, creation_time)
+
+    def _append(
+                self,
+                op: int,
+                identifier: int,
+                author: int=0,
+                creation_time: float=0.0,
+                content: bytes=b''
+            ) -> int:
+        """Append a record to the log, returning its offset."""
+        offset = self.log_length
+        self.log.write(
+            RECORD.pack(op, identifier, author, creation_time, len(content))
+            + content
+        )
+        self._sync()
+        self.log_length += RECORD.size + len(content)
+        return offset
+
+    # -- the Storage interface ---------------------------------------------
+
+    def get(self, identifier: int):
+        """The row with the given identifier, or None if there isn't one."""
+        with self.lock:
+            found = self._lookup(identifier)
+            return None if found is None else self._read(found[1])
+
+    def get_many(self, identifiers: list) -> list:
+        """The rows with any of the given identifiers, ordered by identifier."""
+        with self.lock:
+            found = (
+                self._lookup(identifier)
+                for identifier in sorted(set(identifiers))
+            )
+            return [self._read(each[1]) for each in found if each is not None]
+
+    def all(self, include_archived: bool=False) -> list:
+        """A list of all the rows, ordered by identifier.
+
+        Entries are never archived from the log, so 'include_archived' makes
+        no difference.
+        """
+        with self.lock:
+            return [
+                self._read(offset)
+                for offset in (self._slot(i)[1] for i in range(self.count))
+                if offset >= 0
+            ]
+
+    def add(self, content: str, author: int, identifier: int=None) -> tuple:
+        """Store a new entry, returning its row."""
+        with self.lock:
+            if identifier is None:
+                identifier = new_identifier()
+            elif self._lookup(identifier) is not None:
+                raise EntryExists(identifier)
+            creation_time = datetime.now().timestamp()
+            offset = self._append(
+                ADD, identifier, author, creation_time,
+                content.encode('utf-8')
+            )
+            self._insert(identifier, offset)
+            self._write_header()
+            row = (identifier, content, author, creation_time)
+        # outside the lock, since listeners may read from this engine.
+        self.changed(added=row)
+        return row
+
+    def delete(self, identifier: int) -> bool:
+        """Delete an entry, returning False if there was nothing to delete."""
+        with self.lock:
+            if not self._delete(identifier):
+                return False
+            self._write_header()
+            if self._should_compact():
+                self._compact()
+        self.changed(deleted=identifier)
+        return True
+
+    def delete_by_author(self, author: int, batch_size: int) -> int:
+        """Delete every entry by an author, returning how many were deleted.
+
+        Nothing is archived by this engine. The lock is let go between
+        batches, so adds and reads can carry on.
+        """
+        with self.lock:
+            identifiers = [
+                identifier
+                for identifier, offset in (
+                    self._slot(i) for i in range(self.count)
+                )
+                if offset >= 0 and self._author(offset) == author
+            ]
+        deleted = 0
+        for start in range(0, len(identifiers), batch_size):
+            with self.lock:
+                batch = [
+                    identifier
+                    for identifier in identifiers[start:start + batch_size]
+                    if self._delete(identifier)
+                ]
+                self._write_header()
+                if self._should_compact():
+                    self._compact()
+            for identifier in batch:
+                self.changed(deleted=identifier)
+            deleted += len(batch)
+        return deleted
+
+    def _delete(self, identifier: int) -> bool:
+        found = self._lookup(identifier)
+        if found is None:
+            return False
+        position, offset = found
+        self.dead_bytes += self._record_size(offset)
+        self.dead_bytes += RECORD.size
+        self._append(DELETE, identifier)
+        SLOT.pack_into(
+            self.index, HEADER.size + position * SLOT.size, identifier, -1
+        )
+        return True
+
+    # -- compaction --------------------------------------------------------
+
+    def _should_compact(self) -> bool:
+        live_bytes = self.log_length - self.dead_bytes
+        return self.dead_bytes >= self.min_compact_bytes \
+            and self.dead_bytes > self.compact_ratio * live_bytes
+
+    def compact(self):
+        """Rewrite the log with only the live entries."""
+        with self.lock:
+            self._compact()
+
+    def _compact(self):
+        rows = [
+            self._read(offset)
+            for offset in (self._slot(i)[1] for i in range(self.count))
+            if offset >= 0
+        ]
+        temporary_log = self.path + ".compacting"
+        temporary_index = temporary_log + ".idx"
+        for path in (temporary_log, temporary_index):
+            if exists(path):
+                remove(path)
+        compacted = AppendLogStorage(
+            temporary_log, self.compact_ratio, self.fsync,
+            self.min_compact_bytes
+        )
+        for identifier, content, author, creation_time in rows:
+            offset = compacted._append(
+                ADD, identifier, author, creation_time,
+                content.encode('utf-8')
+            )
+            compacted._insert(identifier, offset)
+        compacted._write_header()
+        compacted.log.flush()
+        os_fsync(compacted.log.fileno())
+        compacted.close()
+        self.index.close()
+        self.index = None
+        self.index_file.close()
+        self.log.close()
+        replace(temporary_log, self.path)
+        replace(temporary_index, self.index_path)
+        self._open()
@@ -0,0 +1,200 @@
+"""A storage engine which spreads entries across several SQLite files.
+
+SQLite lets only one connection write to a file at a time, so with a single
+database every POST in the deployment waits on every other. This engine
+keeps the list_entry table in N separate database files ("shards") and
+sends each entry to the shard chosen by its author, so writes by different
+authors can happen at the same time. Users stay in the app's main
+database, which acts as the directory.
+
+Identifiers are the same snowflake IDs the other engines use, so they're
+unique across shards, but since clients may choose them they don't say
+which shard an entry is in. Looking up or deleting a single entry, like
+reading the whole list, queries every shard at once from a thread pool;
+lists are merged in order of identifier.
+
+Since each shard only knows its own entries, an identifier chosen by a
+client is checked against every shard before it's added. Within a process,
+adds with chosen identifiers are serialized so the check can't race; a
+race within one shard is caught by its primary key. Two processes adding
+the same chosen identifier for authors on different shards at once can
+still both succeed, so deployments with several processes should leave
+identifiers to the server, or use another engine.
+
+Archiving isn't supported by this engine; /list only returns the entries
+in the shards.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from heapq import merge
+from threading import Lock
+from sqlalchemy import create_engine, event, select, MetaData, Table, Column
+from sqlalchemy.exc import IntegrityError
+from api.models import ListEntry, new_identifier
+from api.storage import EntryExists, Storage
+
+
+def _shard_table(metadata: MetaData) -> Table:
+    """A copy of the list_entry table, without the foreign key to user.
+
+    The user table lives in the main database, not in the shards.
+    """
+    return Table(ListEntry.__tablename__, metadata, *(
+        Column(
+            column.name, column.type, primary_key=column.primary_key,
+            autoincrement=False, index=column.index
+        ) for column in ListEntry.__table__.columns
+    ))
+
+
+def _use_wal(connection, record):
+    """Let readers of a shard carry on while it's being written to."""
+    cursor = connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+class ShardedStorage(Storage):
+    """Store entries in one of several SQLite files, chosen by author."""
+
+    def __init__(self, paths: list, chunk_size: int=500):
+        self.chunk_size = chunk_size
+        self.metadata = MetaData()
+        self.table = _shard_table(self.metadata)
+        self.shards = []
+        for path in paths:
+            engine = create_engine(f"sqlite:///{path}")
+            event.listen(engine, "connect", _use_wal)
+            self.metadata.create_all(engine)
+            self.shards.append(engine)
+        self.pool = ThreadPoolExecutor(max_workers=len(self.shards))
+        # held while an identifier chosen by a client is checked and added.
+        self.chosen_lock = Lock()
+
+    @property
+    def count(self) -> int:
+        return len(self.shards)
+
+    def _read_shard(self, number: int) -> list:
+        """All the rows in one shard."""
+        table = self.table
+        with self.shards[number].connect() as connection:
+            return [
+                tuple(row) for row in connection.execute(
+                    table.select().order_by(table.c.identifier)
+                )
+            ]
+
+    def _get_from_shard(self, number: int, identifier: int):
+        with self.shards[number].connect() as connection:
+            row = connection.execute(self.table.select().where(
+                self.table.c.identifier == identifier
+            )).first()
+        return None if row is None else tuple(row)
+
+    def _get_many_from_shard(self, number: int, identifiers: list) -> list:
+        table = self.table
+        with self.shards[number].connect() as connection:
+            return [
+                tuple(row)
+                for start in range(0, len(identifiers), self.chunk_size)
+                for row in connection.execute(
+                    table.select().where(table.c.identifier.in_(
+                        identifiers[start:start + self.chunk_size]
+                    )).order_by(table.c.identifier)
+                )
+            ]
+
+    def delete_by_author(self, author: int, batch_size: int) -> int:
+        """Delete every entry by an author, returning how many were deleted.
+
+        Only the author's shard is touched; each batch is deleted in a
+        transaction of its own.
+        """
+        key = self.table.c.identifier
+        deleted = 0
+        while True:
+            with self.shards[author % self.count].begin() as connection:
+                identifiers = connection.execute(
+                    select(key).where(self.table.c.author == author)
+                    .limit(batch_size)
+                ).scalars().all()
+                connection.execute(
+                    self.table.delete().where(key.in_(identifiers))
+                )
+            for identifier in identifiers:
+                self.changed(deleted=identifier)
+            deleted += len(identifiers)
+            if len(identifiers) < batch_size:
+                return deleted
+
+    def _delete_from_shard(self, number: int, identifier: int) -> int:
+        with self.shards[number].begin() as connection:
+            return connection.execute(self.table.delete().where(
+                self.table.c.identifier == identifier
+            )).rowcount
+
+    def _on_every_shard(self, method, *args) -> list:
+        """Call method(shard number, *args) for every shard at once."""
+        return list(self.pool.map(
+            lambda number: method(number, *args), range(self.count)
+        ))
+
+    def get(self, identifier: int):
+        """The row with the given identifier, or None if there isn't one."""
+        for row in self._on_every_shard(self._get_from_shard, identifier):
+            if row is not None:
+                return row
+        return None
+
+    def get_many(self, identifiers: list) -> list:
+        """The rows with any of the given identifiers, ordered by identifier.
+
+        Every shard is asked for all of them at once, in IN queries of up to
+        'chunk_size' identifiers.
+        """
+        identifiers = sorted(set(identifiers))
+        return list(merge(*self._on_every_shard(
+            self._get_many_from_shard, identifiers
+        )))
+
+    def all(self, include_archived: bool=False) -> list:
+        """A list of all the rows, ordered by identifier.
+
+        The shards are read concurrently. Nothing is archived from the
+        shards, so 'include_archived' makes no difference.
+        """
+        return list(merge(*self.pool.map(
+            self._read_shard, range(self.count)
+        )))
+
+    def add(self, content: str, author: int, identifier: int=None) -> tuple:
+        """Store a new entry in its author's shard, returning its row."""
+        if identifier is None:
+            row = self._insert(content, author, new_identifier())
+        else:
+            with self.chosen_lock:
+                if self.get(identifier) is not None:
+                    raise EntryExists(identifier)
+                row = self._insert(content, author, identifier)
+        self.changed(added=row)
+        return row
+
+    def _insert(self, content: str, author: int, identifier: int) -> tuple:
+        creation_time = datetime.now().timestamp()
+        try:
+            with self.shards[author % self.count].begin() as connection:
+                connection.execute(self.table.insert().values(
+                    identifier=identifier, content=content, author=author,
+                    creation_time=creation_time
+                ))
+        except IntegrityError:
+            raise EntryExists(identifier)
+        return (identifier, content, author, creation_time)
+
+    def delete(self, identifier: int) -> bool:
+        """Delete an entry, returning False if there was nothing to delete."""
+        if not any(self._on_every_shard(self._delete_from_shard, identifier)):
+            return False
+        self.changed(deleted=identifier)
+        return True
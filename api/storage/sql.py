@@ -0,0 +1,131 @@
+"""The SQLAlchemy storage engine, backed by the ListEntry table.
+
+Writes go through the ORM, but reads select column tuples with SQLAlchemy
+Core and hand them straight to the caller. The routes only ever need the
+four attributes of each entry, so building ListEntry objects and tracking
+them in the session's identity map would be wasted work.
+"""
+from heapq import merge
+from sqlalchemy.exc import IntegrityError
+from api import app, db
+from api.models import ArchivedListEntry, ListEntry
+from api.storage import EntryExists, Storage
+from api.wire import ENTRY_FIELDS
+
+entries = ListEntry.__table__
+archive = ArchivedListEntry.__table__
+# table.select() returns the columns in the order they're defined in, which
+# must be the row tuple order.
+assert tuple(entries.columns.keys()) == ENTRY_FIELDS
+assert tuple(archive.columns.keys()) == ENTRY_FIELDS
+
+
+class SQLAlchemyStorage(Storage):
+    """Store entries in the app's database."""
+
+    def get(self, identifier: int):
+        """The row with the given identifier, or None if there isn't one."""
+        row = db.session.execute(
+            entries.select().where(entries.c.identifier == identifier)
+        ).first()
+        return None if row is None else tuple(row)
+
+    def get_many(self, identifiers: list) -> list:
+        """The rows with any of the given identifiers, ordered by identifier.
+
+        Identifiers are looked up with IN queries of up to GET_MANY_CHUNK_SIZE
+        at a time, to stay under the database's limit on bound parameters.
+        """
+        identifiers = sorted(set(identifiers))
+        size = app.config['GET_MANY_CHUNK_SIZE']
+        rows = []
+        for start in range(0, len(identifiers), size):
+            rows.extend(
+                tuple(row) for row in db.session.execute(
+                    entries.select().where(entries.c.identifier.in_(
+                        identifiers[start:start + size]
+                    )).order_by(entries.c.identifier)
+                )
+            )
+        return rows
+
+    def all(self, include_archived: bool=False) -> list:
+        """A list of all the rows, ordered by identifier.
+
+        If 'include_archived' is set, rows from the archive table are
+        merged in.
+        """
+        rows = [
+            tuple(row) for row in db.session.execute(
+                entries.select().order_by(entries.c.identifier)
+            )
+        ]
+        if not include_archived:
+            return rows
+        archived = (
+            tuple(row) for row in db.session.execute(
+                archive.select().order_by(archive.c.identifier)
+            )
+        )
+        return list(merge(archived, rows))
+
+    def add(self, content: str, author: int, identifier: int=None) -> tuple:
+        """Store a new entry, returning its row."""
+        if identifier is not None and db.session.execute(
+                    archive.select().where(archive.c.identifier == identifier)
+                ).first() is not None:
+            raise EntryExists(identifier)
+        the_entry = ListEntry(
+            content=content, author=author, identifier=identifier
+        )
+        db.session.add(the_entry)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            raise EntryExists(identifier)
+        self.changed(added=the_entry.row)
+        return the_entry.row
+
+    def delete(self, identifier: int) -> bool:
+        """Delete an entry, returning False if there was nothing to delete."""
+        deleted = ListEntry.query.filter_by(identifier=identifier).delete()
+        db.session.commit()
+        if deleted:
+            self.changed(deleted=identifier)
+        return deleted > 0
+
+    def delete_by_author(self, author: int, batch_size: int) -> int:
+        """Delete every entry by an author, returning how many were deleted.
+
+        The author's entries are deleted from the list_entry table, then the
+        archive table, each batch by a DELETE statement committed by itself.
+        """
+        deleted = 0
+        for table in (entries, archive):
+            for identifiers in delete_in_batches(
+                        table, table.c.author == author, batch_size
+                    ):
+                deleted += len(identifiers)
+                for identifier in identifiers:
+                    self.changed(deleted=identifier)
+        return deleted
+
+
+def delete_in_batches(table, condition, batch_size: int):
+    """Delete the rows of table matching condition, a batch at a time.
+
+    Each batch is a single DELETE statement, committed before the next.
+    Yields the list of identifiers in each batch once it's committed.
+    """
+    key = table.c.identifier
+    while True:
+        identifiers = db.session.execute(
+            db.select(key).where(condition).limit(batch_size)
+        ).scalars().all()
+        if identifiers:
+            db.session.execute(table.delete().where(key.in_(identifiers)))
+            db.session.commit()
+            yield identifiers
+        if len(identifiers) < batch_size:
+            return
@@ -0,0 +1,83 @@
+"""Hashing of users' tokens.
+
+Tokens are ENTROPY_BITS random bits, not passwords a person chose, so
+guessing one from its hash is hopeless however fast the hash is, and the
+deliberately slow key derivation werkzeug uses for passwords buys nothing
+but latency on every authenticated request. The scheme is chosen by
+Config.TOKEN_HASH_METHOD:
+    "sha256"        SHA-256 of the token. The default.
+    "hmac-sha256"   HMAC-SHA256 of the token, keyed with TOKEN_HASH_KEY, so
+                    that the hashes are useless without the key too.
+    anything else   A method for werkzeug's generate_password_hash, such as
+                    "scrypt" or "pbkdf2:sha256", for the old behavior.
+Hashes are stored as "method$salt$hash", like werkzeug's, so hashes made by
+any scheme can be checked whatever the current one is. When a token is
+checked successfully against a hash made by a different scheme, it's
+hashed again with the current one (see User.check_token), so existing
+hashes move to a new scheme as their users come back, without any tokens
+being changed.
+"""
+from hashlib import sha256
+from hmac import compare_digest, new as hmac
+from werkzeug.security import check_password_hash, generate_password_hash
+from api import app
+
+FAST_METHODS = ('sha256', 'hmac-sha256')
+
+
+def _key() -> bytes:
+    key = app.config['TOKEN_HASH_KEY']
+    if not key:
+        raise ValueError(
+            "TOKEN_HASH_KEY must be set to use the hmac-sha256 method."
+        )
+    return key.encode('utf-8') if isinstance(key, str) else key
+
+
+def _digest(method: str, token: bytes) -> str:
+    if method == 'sha256':
+        return sha256(token).hexdigest()
+    return hmac(_key(), token, sha256).hexdigest()
+
+
+def _text(token: bytes) -> str:
+    # werkzeug hashes the UTF-8 encoding of a str, and newer versions won't
+    # take bytes at all. Tokens are ASCII.
+    return token.decode('utf-8', 'replace')
+
+
+def hash_token(token: bytes, method: str=None) -> str:
+    """Hash a token with 'method', TOKEN_HASH_METHOD by default."""
+    if method is None:
+        method = app.config['TOKEN_HASH_METHOD']
+    if method in FAST_METHODS:
+        return f"{method}$${_digest(method, token)}"
+    return generate_password_hash(_text(token), method=method)
+
+
+def check_token_hash(token_hash: str, token: bytes) -> bool:
+    """Check a token against a hash made by any of the schemes."""
+    if not token_hash:
+        return False
+    method = token_hash.split('$', 1)[0]
+    if method in FAST_METHODS:
+        try:
+            expected = _digest(method, token)
+        except ValueError:
+            return False
+        return compare_digest(f"{method}$${expected}", token_hash)
+    return check_password_hash(token_hash, _text(token))
+
+
+def needs_rehash(token_hash: str, method: str=None) -> bool:
+    """Whether a hash was made by a scheme other than 'method'.
+
+    'method' defaults to TOKEN_HASH_METHOD. werkzeug methods match hashes
+    made with any parameters, e.g. "scrypt" matches "scrypt:32768:8:1".
+    """
+    if method is None:
+        method = app.config['TOKEN_HASH_METHOD']
+    stored = token_hash.split('$', 1)[0]
+    if method in FAST_METHODS:
+        return stored != method
+    return stored != method and not stored.startswith(method + ':')
@@ -0,0 +1,150 @@
+"""Encoding of list entries for the wire.
+
+JSON is always available and is the default. MessagePack and CBOR are used
+when the client asks for them in its Accept header and the corresponding
+package (msgpack or cbor2) is installed.
+
+A single entry is encoded as a map of its attributes, the same as
+ListEntry.json. A list of entries is encoded as a map of columns, each an
+array with one value per entry:
+    {
+        "identifier":       [1, 2, ...],
+        "content":          ["milk", "eggs", ...],
+        "author":           [1, 1, ...],
+        "creation_time":    [1526860000, 1526860005, ...]
+    }
+which is both smaller and faster to pack than an array of maps. Use
+decode_entries to turn either layout back into a list of dicts.
+
+The entries found by a GET /entry for several identifiers are encoded as
+    {"entries": <list of entries, as above>, "missing": [3, ...]}
+where "missing" lists the requested identifiers with no entry.
+
+Identifiers are snowflake IDs (see misc_functions.snowflake), around 2**60,
+and are encoded as integers in every format. JSON parsers which read every
+number as a double, such as JavaScript's JSON.parse, round integers above
+2**53, so those clients get the wrong identifiers. They must parse the
+identifiers as big integers, e.g. with a JSON.parse reviver reading the
+source text, or ask for MessagePack or CBOR, which keep 64-bit integers.
+"""
+from json import dumps as toJSONtext, loads as fromJSONtext
+from typing import Dict, List
+from strict_hint import strict
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+# The order of the values in a row tuple, as given by ListEntry.row
+ENTRY_FIELDS = ('identifier', 'content', 'author', 'creation_time')
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+CBOR = 'application/cbor'
+# Alternative names clients might send for the same formats.
+ALIASES = {
+    'application/x-msgpack': MSGPACK,
+    'application/vnd.msgpack': MSGPACK,
+}
+
+
+@strict
+def available_mimetypes() -> list:
+    """The mimetypes we can encode to, most preferred first."""
+    mimetypes = [JSON]
+    if msgpack is not None:
+        mimetypes += [MSGPACK, *ALIASES.keys()]
+    if cbor2 is not None:
+        mimetypes.append(CBOR)
+    return mimetypes
+
+
+def negotiate(accept) -> str:
+    """Choose a mimetype based on a request's accept_mimetypes.
+
+    Falls back to JSON when the client doesn't express a preference or asks
+    only for something we can't provide.
+    """
+    best = accept.best_match(available_mimetypes(), default=JSON)
+    return ALIASES.get(best, best)
+
+
+def _pack(value, mimetype: str) -> bytes:
+    """Serialize a plain value in the given format."""
+    if mimetype == MSGPACK:
+        return msgpack.packb(value, use_bin_type=True)
+    if mimetype == CBOR:
+        return cbor2.dumps(value)
+    return toJSONtext(value).encode('utf-8')
+
+
+def _unpack(data: bytes, mimetype: str):
+    """Deserialize a plain value from the given format."""
+    mimetype = ALIASES.get(mimetype, mimetype)
+    if mimetype == MSGPACK:
+        return msgpack.unpackb(data, raw=False)
+    if mimetype == CBOR:
+        return cbor2.loads(data)
+    return fromJSONtext(data)
+
+
+@strict
+def columns_of(rows: list) -> Dict[str, list]:
+    """Transpose a list of row tuples into the columnar layout."""
+    if not rows:
+        return {field: [] for field in ENTRY_FIELDS}
+    return dict(zip(ENTRY_FIELDS, map(list, zip(*rows))))
+
+
+@strict
+def encode_entry(row: tuple, mimetype: str) -> bytes:
+    """Encode a single entry's row tuple as a map."""
+    return _pack(dict(zip(ENTRY_FIELDS, row)), mimetype)
+
+
+@strict
+def encode_entries(rows: list, mimetype: str) -> bytes:
+    """Encode a list of row tuples.
+
+    JSON keeps the array-of-maps layout existing clients expect, the binary
+    formats use the columnar layout.
+    """
+    if mimetype == JSON:
+        return _pack([dict(zip(ENTRY_FIELDS, row)) for row in rows], JSON)
+    return _pack(columns_of(rows), mimetype)
+
+
+@strict
+def encode_lookup(rows: list, missing: list, mimetype: str) -> bytes:
+    """Encode the result of looking up several entries by identifier."""
+    if mimetype == JSON:
+        entries = [dict(zip(ENTRY_FIELDS, row)) for row in rows]
+    else:
+        entries = columns_of(rows)
+    return _pack({'entries': entries, 'missing': missing}, mimetype)
+
+
+@strict
+def decode_entries(data: bytes, mimetype: str) -> List[dict]:
+    """Decode a response body into a list of entry dicts.
+
+    Accepts any of the layouts produced by this module: a single entry, an
+    array of entries, or the columnar layout, on their own or as the
+    entries of a lookup.
+    """
+    value = _unpack(data, mimetype.split(';')[0].strip())
+    if isinstance(value, dict) and 'missing' in value:
+        value = value['entries']
+    if isinstance(value, list):
+        return value
+    if all(isinstance(value.get(field), list) for field in ENTRY_FIELDS):
+        return [
+            dict(zip(ENTRY_FIELDS, row))
+            for row in zip(*(value[field] for field in ENTRY_FIELDS))
+        ]
+    return [value]
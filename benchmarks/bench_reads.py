@@ -0,0 +1,82 @@
+"""Compare the ORM and Core-SQL read paths for listing entries.
+
+Usage:
+    python benchmarks/bench_reads.py [rows ...]
+
+For each row count (100000 and 1000000 by default) a scratch SQLite
+database is filled with that many entries, then listing them is timed both
+the old way (ListEntry.query.all() and ListEntry.row) and through
+SQLAlchemyStorage.all(), each followed by JSON encoding as in /list. The
+best of a few runs of each is printed.
+"""
+from os import close, environ, remove
+from os.path import abspath, dirname, join
+from tempfile import mkstemp
+from time import perf_counter
+import sys
+
+handle, database = mkstemp(suffix=".db")
+close(handle)
+environ["SHOPPING_LIST_DB_URL"] = f"sqlite:///{database}"
+sys.path.insert(0, join(dirname(abspath(__file__)), ".."))
+
+from api import app, db                                     # noqa: E402
+from api.models import ListEntry                            # noqa: E402
+from api.storage.sql import SQLAlchemyStorage, entries      # noqa: E402
+from api.wire import encode_entries, JSON                   # noqa: E402
+
+RUNS = 3
+
+
+def fill(count: int):
+    """Replace the entries in the scratch database with 'count' new ones."""
+    db.session.execute(entries.delete())
+    db.session.execute(entries.insert(), [
+        {
+            'identifier': i + 1,
+            'content': f"Item number {i}",
+            'author': i % 10,
+            'creation_time': 1526860000 + i,
+        } for i in range(count)
+    ])
+    db.session.commit()
+
+
+def orm_read() -> bytes:
+    rows = [entry.row for entry in ListEntry.query.all()]
+    db.session.expunge_all()
+    return encode_entries(rows, JSON)
+
+
+def core_read() -> bytes:
+    return encode_entries(SQLAlchemyStorage().all(), JSON)
+
+
+def best_of(function) -> float:
+    """The shortest time taken by function in RUNS runs."""
+    times = []
+    for _ in range(RUNS):
+        start = perf_counter()
+        function()
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def main(counts):
+    with app.app_context():
+        db.create_all()
+        print(f"{'rows':>10} {'ORM (s)':>10} {'Core (s)':>10} {'speedup':>8}")
+        for count in counts:
+            fill(count)
+            orm = best_of(orm_read)
+            core = best_of(core_read)
+            print(
+                f"{count:>10} {orm:>10.3f} {core:>10.3f} {orm / core:>7.1f}x"
+            )
+
+
+if __name__ == '__main__':
+    try:
+        main([int(arg) for arg in sys.argv[1:]] or [100000, 1000000])
+    finally:
+        remove(database)
@@ -0,0 +1,51 @@
+"""Compare the cost of checking a token under each hashing scheme.
+
+Usage:
+    python benchmarks/bench_tokens.py [method ...]
+
+For each method ("sha256", "hmac-sha256" and werkzeug's "pbkdf2:sha256"
+and "scrypt" by default) a token of ENTROPY_BITS bits is hashed, then
+checked repeatedly with api.tokens.check_token_hash, as on every request
+authenticated with a token. The mean time per check and the checks per
+second one core can do are printed.
+"""
+from os.path import abspath, dirname, join
+from time import perf_counter
+import sys
+
+sys.path.insert(0, join(dirname(abspath(__file__)), ".."))
+
+from api import app                                         # noqa: E402
+from api.tokens import check_token_hash, hash_token         # noqa: E402
+from misc_functions import get_entropy                      # noqa: E402
+
+# Seconds to spend checking tokens for each method.
+DURATION = 2.0
+DEFAULT_METHODS = ["sha256", "hmac-sha256", "pbkdf2:sha256", "scrypt"]
+
+
+def time_checks(method: str) -> float:
+    """The mean time in seconds to check a token hashed with 'method'."""
+    token = get_entropy(app.config['ENTROPY_BITS'])
+    token_hash = hash_token(token, method)
+    checks = 0
+    start = perf_counter()
+    while perf_counter() - start < DURATION:
+        assert check_token_hash(token_hash, token)
+        checks += 1
+    return (perf_counter() - start) / checks
+
+
+def main(methods):
+    app.config['TOKEN_HASH_KEY'] = app.config['TOKEN_HASH_KEY'] \
+        or get_entropy(256)
+    print(f"{'method':>16} {'per check':>12} {'checks/s':>12}")
+    for method in methods:
+        seconds = time_checks(method)
+        print(
+            f"{method:>16} {seconds * 1e6:>10.1f}us {1 / seconds:>12.0f}"
+        )
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or DEFAULT_METHODS)
@@ -5,11 +5,81 @@ from os import environ
 class Config:
     """Static configuration object."""
     debug = DEBUG_FLAG = True
-    SECRET_KEY = get_entropy(500)
+    # Signs session credentials, so must be shared by every process serving
+    # the API for a credential to be accepted by all of them.
+    SECRET_KEY = environ.get("SHOPPING_LIST_SECRET_KEY") or get_entropy(500)
+    # Seconds a session credential from /session stays valid for.
+    SESSION_LIFETIME = 15 * 60
+    # Seconds each process may go on trusting the token hash it last saw for
+    # a user, so the longest a session credential stays usable elsewhere
+    # after its user gets a new token.
+    SESSION_GENERATION_MAX_AGE = 30
     SQLALCHEMY_DATABASE_URI = environ.get("SHOPPING_LIST_DB_URL")\
         or f"sqlite:///{join(abspath(dirname(__file__)))}/dev.db"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Where list entries are kept, "sqlalchemy", "appendlog" or "sharded".
+    # See api.storage.
+    STORAGE_ENGINE = environ.get("SHOPPING_LIST_STORAGE") or "sqlalchemy"
+    APPEND_LOG_PATH = environ.get("SHOPPING_LIST_LOG_PATH")\
+        or f"{join(abspath(dirname(__file__)))}/dev.log"
+    APPEND_LOG_COMPACT_RATIO = 1.0
+    APPEND_LOG_FSYNC = False
+    # Seconds before the in-memory copy of the entries used by /stats is
+    # reloaded, to pick up changes made by other processes.
+    STATS_MAX_AGE = 60
+    # A GET /entry for several entries may name up to GET_MANY_MAX of them,
+    # which are looked up GET_MANY_CHUNK_SIZE at a time (SQLite allows 999
+    # bound parameters per query in older versions).
+    GET_MANY_MAX = 1000
+    GET_MANY_CHUNK_SIZE = 500
+    SHARD_COUNT = 4
+    SHARD_PATH_TEMPLATE = environ.get("SHOPPING_LIST_SHARD_PATH")\
+        or f"{join(abspath(dirname(__file__)))}/dev-shard-{{}}.db"
+    # Entries older than this many seconds are moved to the archive table by
+    # "flask archive-entries", this many at a time, pausing between batches
+    # so other writers can get at the database.
+    ARCHIVE_AFTER = 30 * 24 * 60 * 60
+    ARCHIVE_BATCH_SIZE = 500
+    ARCHIVE_PAUSE = 0.05
+    # Rows removed by each DELETE statement when a user's entries are
+    # deleted along with them.
+    DELETE_BATCH_SIZE = 1000
     ENTROPY_BITS = 500
+    # How tokens are hashed: "sha256", "hmac-sha256" (keyed with
+    # TOKEN_HASH_KEY, which must then stay the same) or a werkzeug password
+    # hashing method. Older hashes are replaced as tokens are checked. See
+    # api.tokens.
+    TOKEN_HASH_METHOD = environ.get("SHOPPING_LIST_TOKEN_HASH") or "sha256"
+    TOKEN_HASH_KEY = environ.get("SHOPPING_LIST_TOKEN_HASH_KEY")
+    # Distinguishes the list entry identifiers made by each process; every
+    # process serving the API must have a different one, from 0 to 1023.
+    # If it isn't set, each process uses its PID modulo 1024, which differs
+    # between the workers of one server, but not necessarily across
+    # servers, so set it on each process of a multi-server deployment.
+    SNOWFLAKE_NODE = int(environ["SHOPPING_LIST_NODE"]) \
+        if environ.get("SHOPPING_LIST_NODE") else None
+    # The responses to POSTs with an Idempotency-Key header are replayed to
+    # retries with the same key for this many seconds, for up to this many
+    # keys per process. If IDEMPOTENCY_TABLE is set they're also stored in
+    # the database, to be replayed by every process.
+    IDEMPOTENCY_TTL = 24 * 60 * 60
+    IDEMPOTENCY_MAX_KEYS = 10000
+    IDEMPOTENCY_TABLE = bool(environ.get("SHOPPING_LIST_IDEMPOTENCY_TABLE"))
     PUBLISH_PORT = 5000
     PROTO = "http"
     SERVER_URL = f"localhost:{PUBLISH_PORT}"
+    # Token-bucket limits, checked before authentication. Rates are in
+    # requests per second, bursts are the bucket sizes.
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMIT_UID_RATE = 5.0
+    RATE_LIMIT_UID_BURST = 20
+    RATE_LIMIT_ADDRESS_RATE = 20.0
+    RATE_LIMIT_ADDRESS_BURST = 50
+    RATE_LIMIT_MAX_KEYS = 10000
+    # At most ADMISSION_MAX_ACTIVE requests are handled at once; up to
+    # ADMISSION_MAX_QUEUE more wait, for up to ADMISSION_MAX_WAIT seconds,
+    # and the rest are answered 503. See api.admission.
+    ADMISSION_ENABLED = True
+    ADMISSION_MAX_ACTIVE = 16
+    ADMISSION_MAX_QUEUE = 32
+    ADMISSION_MAX_WAIT = 0.5
@@ -0,0 +1,34 @@
+"""Add the list entry archive table
+
+Revision ID: 8f3b2c1d9e4a
+Revises: 322c84e86758
+Create Date: 2026-10-19 09:02:11.418230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3b2c1d9e4a'
+down_revision = '322c84e86758'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('list_entry_archive',
+    sa.Column('identifier', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('content', sa.String(length=256), nullable=True),
+    sa.Column('author', sa.Integer(), nullable=True),
+    sa.Column('creation_time', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['author'], ['user.identifier'], ),
+    sa.PrimaryKeyConstraint('identifier')
+    )
+    op.create_index(op.f('ix_list_entry_creation_time'), 'list_entry',
+                    ['creation_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_list_entry_creation_time'), table_name='list_entry')
+    op.drop_table('list_entry_archive')
@@ -0,0 +1,36 @@
+"""Use 64-bit list entry identifiers and float creation times
+
+Revision ID: a41c7e52b0d3
+Revises: 8f3b2c1d9e4a
+Create Date: 2026-10-19 11:47:30.205114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41c7e52b0d3'
+down_revision = '8f3b2c1d9e4a'
+branch_labels = None
+depends_on = None
+
+TABLES = ('list_entry', 'list_entry_archive')
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('identifier', existing_type=sa.Integer(),
+                                  type_=sa.BigInteger(), autoincrement=False)
+            batch_op.alter_column('creation_time', existing_type=sa.Integer(),
+                                  type_=sa.Float())
+
+
+def downgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('creation_time', existing_type=sa.Float(),
+                                  type_=sa.Integer())
+            batch_op.alter_column('identifier', existing_type=sa.BigInteger(),
+                                  type_=sa.Integer())
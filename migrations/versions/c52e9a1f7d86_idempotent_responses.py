@@ -0,0 +1,37 @@
+"""Add the idempotent response table
+
+Revision ID: c52e9a1f7d86
+Revises: a41c7e52b0d3
+Create Date: 2026-10-19 13:12:05.871442
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e9a1f7d86'
+down_revision = 'a41c7e52b0d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('idempotent_response',
+    sa.Column('uid', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('fingerprint', sa.String(length=64), nullable=True),
+    sa.Column('status', sa.Integer(), nullable=True),
+    sa.Column('content_type', sa.String(length=64), nullable=True),
+    sa.Column('body', sa.LargeBinary(), nullable=True),
+    sa.Column('expires', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('uid', 'key')
+    )
+    op.create_index(op.f('ix_idempotent_response_expires'),
+                    'idempotent_response', ['expires'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_idempotent_response_expires'),
+                  table_name='idempotent_response')
+    op.drop_table('idempotent_response')
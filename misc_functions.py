@@ -4,18 +4,47 @@ All code in this file should be purely functional.
 """
 
 from subprocess import run, PIPE, CompletedProcess
-from os.path import isdir, dirname, realpath
+from os.path import isdir, dirname, realpath, relpath
 from os.path import join as getpath
-from os import access, listdir, removedirs, stat, walk
+from os import access, listdir, remove, replace, scandir, stat, utime
 from os import F_OK as file_exists
 from os import X_OK as executable_file
 from os import makedirs as mkdir
 from os import sep as root
-from shutil import copytree, copy
+from shutil import copy, copy2
 from hashlib import sha256
+from concurrent.futures import ThreadPoolExecutor
+from time import time
 from strict_hint import strict
 import random
 
+# How much of a file hash_of_file reads at a time.
+HASH_CHUNK_SIZE = 1 << 20
+# Snowflake IDs are made of, from the most significant bit down, 41 bits of
+# milliseconds since SNOWFLAKE_EPOCH, 10 bits of node number and 12 bits of
+# sequence number, leaving the sign bit of a 64-bit integer clear.
+SNOWFLAKE_EPOCH = 1514764800000     # 2018-01-01T00:00:00Z, in milliseconds
+SNOWFLAKE_NODE_BITS = 10
+SNOWFLAKE_SEQUENCE_BITS = 12
+
+
+def walk_files(f: str, *filepath: str):
+    """Generate an os.DirEntry for each file in a folder and its subfolders.
+
+    Directories are read lazily with os.scandir, so the tree is never held
+    in memory as a whole, and the stat results cached on each DirEntry can
+    be used without another system call. Symbolic links to directories are
+    not followed.
+    """
+    pending = [getpath(f, *filepath)]
+    while pending:
+        with scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                else:
+                    yield entry
+
 
 @strict
 def list_recursively(f: str, *filepath: str) -> list:
@@ -26,17 +55,100 @@ def list_recursively(f: str, *filepath: str) -> list:
     if not isdir(getpath(f, *filepath)):
         # If the specified file isn't a directory, just return that one file.
         return [getpath(f, *filepath)]
-    return [
-        getpath(dp, f) for dp, dn, fn in walk(
-            getpath(f, *filepath)
-        ) for f in fn
-    ]
+    return [entry.path for entry in walk_files(f, *filepath)]
+
+
+@strict
+def manifest_of(directory: str) -> dict:
+    """Get the size and modification time of every file in a directory.
+
+    :return: dict: (st_size, st_mtime_ns) keyed by path relative to the
+        directory. Empty if the directory doesn't exist.
+    """
+    if not isdir(directory):
+        return {}
+    manifest = {}
+    for entry in walk_files(directory):
+        info = entry.stat(follow_symlinks=False)
+        manifest[relpath(entry.path, directory)] \
+            = (info.st_size, info.st_mtime_ns)
+    return manifest
+
+
+@strict
+def copy_atomically(src: str, dest: str) -> str:
+    """Copy a file with its metadata, replacing dest in a single step.
+
+    The copy is written next to dest under a temporary name and then
+    renamed over it, so nothing ever sees a partially copied file.
+    """
+    mkdir(dirname(dest), mode=0o755, exist_ok=True)
+    temporary = getpath(dirname(dest), ".sync-%s" % num_to_alpha(
+        random.getrandbits(64)
+    ))
+    try:
+        copy2(src, temporary)
+        replace(temporary, dest)
+    except BaseException:
+        if access(temporary, mode=file_exists):
+            remove(temporary)
+        raise
+    return dest
+
+
+@strict
+def sync_tree(
+            src: str,
+            dest: str,
+            workers: int=8,
+            prune: bool=False
+        ) -> list:
+    """Make the directory dest a copy of src, copying only what changed.
+
+    Files are compared by size and modification time first. Files with the
+    same size but a different time are compared by hash, and if they turn
+    out to be the same only the time is updated, so they aren't hashed
+    again on the next sync. Changed files are copied by a pool of 'workers'
+    threads with copy_atomically. If 'prune' is set, files in dest that
+    aren't in src are deleted.
+
+    :return: list: Paths, relative to dest, of the files copied or deleted.
+    """
+    wanted = manifest_of(src)
+    existing = manifest_of(dest)
+    mkdir(dest, mode=0o755, exist_ok=True)
+
+    def changed(name: str) -> bool:
+        if name not in existing:
+            return True
+        if wanted[name] == existing[name]:
+            return False
+        if wanted[name][0] != existing[name][0]:
+            return True
+        if hash_of_file(src, name) != hash_of_file(dest, name):
+            return True
+        utime(getpath(dest, name), ns=(wanted[name][1], wanted[name][1]))
+        return False
+
+    def sync(name: str):
+        if changed(name):
+            copy_atomically(getpath(src, name), getpath(dest, name))
+            return name
+        return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        done = [name for name in pool.map(sync, wanted) if name is not None]
+    if prune:
+        for name in existing.keys() - wanted.keys():
+            remove(getpath(dest, name))
+            done.append(name)
+    return done
 
 
 @strict
 def hash_of_str(val: str) -> str:
-    """Get the sha256 hash of a string."""
-    return sha256(val.encode('ascii')).hexdigest()
+    """Get the sha256 hash of a string, encoded as UTF-8."""
+    return sha256(val.encode('utf-8')).hexdigest()
 
 
 @strict
@@ -56,8 +168,33 @@ def perms(f: str, *filepath: str) -> int:
 
 @strict
 def hash_of_file(f: str, *filepath: str) -> str:
-    """Get the sha256 hash of a file read by read_absolute."""
-    return hash_of_str(read_absolute(f, *filepath))
+    """Get the sha256 hash of a file's contents.
+
+    The file is read in binary, HASH_CHUNK_SIZE bytes at a time, so any
+    file can be hashed without holding more than one chunk of it in memory.
+    For text files this is the same as hash_of_str of the contents.
+    """
+    digest = sha256()
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(getpath(f, *filepath), 'rb', buffering=0) as file:
+        for size in iter(lambda: file.readinto(buffer), 0):
+            digest.update(view[:size])
+    return digest.hexdigest()
+
+
+@strict
+def hash_of_files(f: str, *filepath: str, workers: int=8) -> dict:
+    """Get the sha256 hashes of every file found by list_recursively.
+
+    The files are hashed by a pool of 'workers' threads; hashlib releases
+    the GIL while hashing, so large trees are hashed in parallel.
+
+    :return: dict: The hash of each file, keyed by its path.
+    """
+    paths = list_recursively(f, *filepath)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(paths, pool.map(hash_of_file, paths)))
 
 
 @strict
@@ -92,14 +229,16 @@ def runcmd(cmd: str) -> CompletedProcess:
 
 
 @strict
-def check_isdir(filepath: str, src: str='') -> bool:
+def check_isdir(filepath: str, src: str='', sync: bool=False) -> bool:
     """Check to make sure a particular filepath is a directory.
 
     Also check that it's not a file and create it if it doesn't already
     exist.
 
     If src is specified it must be a path to be recursively copied into the
-    directory should it not exist or be empty.
+    directory should it not exist or be empty. If 'sync' is also set and src
+    is a directory, an existing directory is brought up to date with src
+    by sync_tree, copying only the files which changed.
     """
     if not isdir(filepath):
         if access(filepath, mode=file_exists):
@@ -109,7 +248,7 @@ def check_isdir(filepath: str, src: str='') -> bool:
         if src:
             if isdir(src):
                 # recursively copy source dir.
-                copytree(src, filepath)
+                sync_tree(src, filepath)
                 return True
         # The returns mean the else is implied.
         # src not specified, just make an empty dir.
@@ -121,12 +260,15 @@ def check_isdir(filepath: str, src: str='') -> bool:
     if not listdir(filepath) and src:
         # The directory is empty but a source file/directory was passed.
         if isdir(src):
-            removedirs(filepath)
-            copytree(src, filepath)
+            sync_tree(src, filepath)
             return True
         # the src is just a single file, so copy it to the existing dir.
         copy(src, filepath)
         return True
+    if sync and src and isdir(src):
+        # the directory has been deployed to before, just update it.
+        sync_tree(src, filepath)
+        return True
     if access(filepath, executable_file):
         # the source hasn't ben specified and the directory already exists.
         return True
@@ -205,3 +347,67 @@ def build_url(proto: str, fqdn: str, *endpoint: str) -> str:
     """
     assert proto in ('http', 'https', 'unix')
     return f"{proto}://{fqdn}/" + '/'.join(endpoint)
+
+
+@strict
+def percentile(values: list, percent: int) -> float:
+    """The nearest-rank percentile of a list of numbers.
+
+    'values' must already be sorted. Returns 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * percent // 100))
+    return float(values[int(rank) - 1])
+
+
+@strict
+def snowflake(milliseconds: int, node: int, sequence: int) -> int:
+    """Build a snowflake ID from its parts.
+
+    'milliseconds' is a UNIX time in milliseconds. IDs sort in the order
+    of their times, then their node numbers, then their sequence numbers.
+    """
+    if not 0 <= node < 1 << SNOWFLAKE_NODE_BITS:
+        raise ValueError("Node %d doesn't fit in a snowflake ID." % node)
+    if not 0 <= sequence < 1 << SNOWFLAKE_SEQUENCE_BITS:
+        raise ValueError(
+            "Sequence %d doesn't fit in a snowflake ID." % sequence
+        )
+    return (
+        (milliseconds - SNOWFLAKE_EPOCH)
+        << SNOWFLAKE_NODE_BITS + SNOWFLAKE_SEQUENCE_BITS
+    ) | (node << SNOWFLAKE_SEQUENCE_BITS) | sequence
+
+
+@strict
+def snowflake_time(identifier: int) -> float:
+    """Get the UNIX time, in seconds, at which a snowflake ID was made."""
+    return (
+        (identifier >> SNOWFLAKE_NODE_BITS + SNOWFLAKE_SEQUENCE_BITS)
+        + SNOWFLAKE_EPOCH
+    ) / 1000
+
+
+def snowflake_ids(node: int=0):
+    """Generate increasing snowflake IDs for the given node number.
+
+    Up to 4096 IDs are generated per millisecond; past that, the generator
+    waits for the next millisecond. If the clock goes backwards the last
+    time seen is reused, so IDs never decrease. The generator isn't thread
+    safe, so calls to next() on it must be serialized.
+    """
+    last = 0
+    sequence = 0
+    while True:
+        now = max(int(time() * 1000), last)
+        if now == last:
+            sequence += 1
+            if sequence >> SNOWFLAKE_SEQUENCE_BITS:
+                while now <= last:
+                    now = int(time() * 1000)
+                sequence = 0
+        else:
+            sequence = 0
+        last = now
+        yield snowflake(now, node, sequence)
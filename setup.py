@@ -33,5 +33,10 @@ setup(
 	"flask-migrate",
 	"flask-login"
     ],
+    extras_require={
+        "msgpack": ["msgpack"],
+        "cbor": ["cbor2"],
+        "stats": ["numpy"],
+    },
     setup_requires=['pytest-runner']
 )
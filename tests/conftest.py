@@ -0,0 +1,29 @@
+"""Configuration shared by the tests.
+
+The tests get a database, append log and shards of their own in a temporary
+directory, set in the environment before api (and so config) is imported,
+so running them never touches dev.db or the other files of a development
+setup.
+"""
+from os import environ
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from pytest import fixture
+
+_directory = mkdtemp(prefix="shopping-list-tests-")
+environ["SHOPPING_LIST_DB_URL"] = f"sqlite:///{join(_directory, 'test.db')}"
+environ["SHOPPING_LIST_LOG_PATH"] = join(_directory, "test.log")
+environ["SHOPPING_LIST_SHARD_PATH"] = join(_directory, "test-shard-{}.db")
+
+
+@fixture(scope="session", autouse=True)
+def database():
+    """Create the schema in the test database, and remove it afterwards."""
+    from api import app, db
+    with app.app_context():
+        db.create_all()
+    yield
+    with app.app_context():
+        db.engine.dispose()
+    rmtree(_directory, ignore_errors=True)
@@ -0,0 +1,42 @@
+"""Tests for the admission.py file in the api module."""
+from threading import Thread
+from time import sleep
+from api.admission import AdmissionController
+
+
+class TestAdmissionController:
+    """Tests for the AdmissionController class."""
+
+    def setup_method(self):
+        """A controller with one slot and room for one waiting request."""
+        self.controller = AdmissionController(
+            max_active=1, max_queue=1, max_wait=0.05
+        )
+
+    def test_admit_and_release(self):
+        """Check that a released slot can be taken again."""
+        assert self.controller.admit()
+        self.controller.release()
+        assert self.controller.admit()
+        assert self.controller.metrics()['admitted'] == 2
+
+    def test_timeout(self):
+        """Check that a request waiting too long for a slot is shed."""
+        assert self.controller.admit()
+        assert not self.controller.admit()
+        assert self.controller.shed == {'timeout': 1}
+        assert self.controller.queued == 0
+
+    def test_queue_full(self):
+        """Check that a request is shed at once if the queue is full."""
+        self.controller.max_wait = 1.0
+        assert self.controller.admit()
+        waiter = Thread(target=self.controller.admit)
+        waiter.start()
+        while not self.controller.queued:
+            sleep(0.001)
+        assert not self.controller.admit()
+        assert self.controller.shed == {'queue_full': 1}
+        self.controller.release()
+        waiter.join()
+        assert self.controller.metrics()['active'] == 1
@@ -0,0 +1,68 @@
+"""Tests for the archive.py file in the api module."""
+from time import time
+from api import app, db
+from api.archive import archive_batch, archive_old_entries
+from api.models import User, ListEntry, ArchivedListEntry
+from api.storage.sql import SQLAlchemyStorage
+from pytest import fixture
+
+
+@fixture
+def uid():
+    """A user with five old entries and two new ones."""
+    with app.app_context():
+        user = User("Archive Test User")
+        db.session.add(user)
+        db.session.commit()
+        entries = [ListEntry(str(i), user.identifier) for i in range(7)]
+        for i, entry in enumerate(entries[:5]):
+            entry.creation_time = 100.0 + i
+        db.session.add_all(entries)
+        db.session.commit()
+        yield user.identifier
+        User.delete(user, user.identifier)
+
+
+def contents(model, uid: int) -> list:
+    return sorted(
+        entry.content for entry in model.query.filter_by(author=uid)
+    )
+
+
+def test_archive_batch(uid):
+    """Check that only entries older than the cutoff move, oldest first."""
+    assert archive_batch(1000.0, 2) == 2
+    assert contents(ArchivedListEntry, uid) == ["0", "1"]
+    assert archive_batch(1000.0, 2) == 2
+    assert archive_batch(1000.0, 2) == 1
+    assert archive_batch(1000.0, 2) == 0
+    assert contents(ArchivedListEntry, uid) == ["0", "1", "2", "3", "4"]
+    assert contents(ListEntry, uid) == ["5", "6"]
+
+
+def test_archive_old_entries(uid):
+    """Check that every old entry is archived, batch after batch."""
+    app.config['ARCHIVE_PAUSE'] = 0
+    try:
+        # a cutoff of 1000.0, as in test_archive_batch, so that only the
+        # fixture's entries are old enough.
+        assert archive_old_entries(
+            max_age=time() - 1000.0, batch_size=2
+        ) == 5
+    finally:
+        app.config['ARCHIVE_PAUSE'] = 0.05
+    assert contents(ArchivedListEntry, uid) == ["0", "1", "2", "3", "4"]
+
+
+def test_all_includes_archived(uid):
+    """Check that archived rows are merged in, in order of identifier."""
+    archive_batch(1000.0, 5)
+    storage = SQLAlchemyStorage()
+    ours = [row for row in storage.all() if row[2] == uid]
+    assert [row[1] for row in ours] == ["5", "6"]
+    everything = [
+        row for row in storage.all(include_archived=True) if row[2] == uid
+    ]
+    assert [row[1] for row in everything] == [str(i) for i in range(7)]
+    identifiers = [row[0] for row in storage.all(include_archived=True)]
+    assert identifiers == sorted(identifiers)
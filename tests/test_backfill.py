@@ -0,0 +1,72 @@
+"""Tests for the backfill.py file in the api module."""
+from api.backfill import backfill
+from pytest import fixture, raises
+from sqlalchemy import (
+    create_engine, event, Column, Integer, MetaData, Table, select
+)
+
+
+@fixture
+def table_and_connection(tmp_path):
+    """A table of 25 rows with an empty 'copy' column."""
+    table = Table(
+        'thing', MetaData(),
+        Column('identifier', Integer, primary_key=True),
+        Column('value', Integer),
+        Column('copy', Integer),
+    )
+    engine = create_engine(f"sqlite:///{tmp_path / 'things.db'}")
+    table.metadata.create_all(engine)
+    with engine.connect() as connection:
+        connection.execute(table.insert(), [
+            {'identifier': i, 'value': i * 2} for i in range(1, 26)
+        ])
+        connection.commit()
+        yield table, connection
+
+
+def copies(table, connection) -> list:
+    return [row[0] for row in connection.execute(
+        select(table.c.copy).order_by(table.c.identifier)
+    )]
+
+
+def test_backfill(table_and_connection):
+    """Check that every matching row is updated, and no others."""
+    table, connection = table_and_connection
+    done = backfill(
+        connection, table, {'copy': table.c.value},
+        where=table.c.identifier > 5, batch_size=4, pause=0
+    )
+    assert done == 20
+    assert copies(table, connection) == [None] * 5 \
+        + [i * 2 for i in range(6, 26)]
+
+
+def test_checkpoint(table_and_connection, tmp_path):
+    """Check that an interrupted backfill resumes from its checkpoint."""
+    table, connection = table_and_connection
+    checkpoint = str(tmp_path / "checkpoint")
+    batches = []
+
+    def interrupt(connection, cursor, statement, *args):
+        if statement.lstrip().startswith("UPDATE"):
+            batches.append(None)
+            if len(batches) == 3:
+                raise KeyboardInterrupt
+
+    event.listen(connection, "before_cursor_execute", interrupt)
+    with raises(KeyboardInterrupt):
+        backfill(
+            connection, table, {'copy': 1}, batch_size=5, pause=0,
+            checkpoint=checkpoint
+        )
+    event.remove(connection, "before_cursor_execute", interrupt)
+    connection.rollback()
+    assert copies(table, connection) == [1] * 10 + [None] * 15
+    assert backfill(
+        connection, table, {'copy': 2}, batch_size=5, pause=0,
+        checkpoint=checkpoint
+    ) == 25
+    assert copies(table, connection) == [1] * 10 + [2] * 15
+    assert not (tmp_path / "checkpoint").exists()
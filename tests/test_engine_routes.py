@@ -0,0 +1,107 @@
+"""Tests of the /entry and /list routes against each storage engine.
+
+These use Flask's test client, with the app's storage engine replaced by a
+fresh instance of each engine in turn.
+"""
+from json import loads
+from api import app, db, storage as storage_module
+from api.models import User
+from api.storage.sql import SQLAlchemyStorage
+from api.storage.appendlog import AppendLogStorage
+from api.storage.sharded import ShardedStorage
+from pytest import fixture
+
+
+@fixture(params=["sqlalchemy", "appendlog", "sharded"])
+def client(request, tmp_path, monkeypatch):
+    """A test client using each engine, and the headers of a new user."""
+    if request.param == "appendlog":
+        engine = AppendLogStorage(str(tmp_path / "entries.log"))
+    elif request.param == "sharded":
+        engine = ShardedStorage([
+            str(tmp_path / f"shard-{number}.db") for number in range(3)
+        ])
+    else:
+        engine = SQLAlchemyStorage()
+    monkeypatch.setattr(storage_module, '_engine', engine)
+    monkeypatch.setitem(app.config, 'RATE_LIMIT_ENABLED', False)
+    with app.app_context():
+        user = User("Engine Routes User")
+        token = user.new_token(lambda token: token)
+        db.session.add(user)
+        db.session.commit()
+        headers = {'uid': str(user.identifier), 'token': token.decode()}
+        yield app.test_client(), headers
+        user.delete()
+    if request.param == "appendlog":
+        engine.close()
+
+
+def test_post_and_get(client):
+    """Check that a POSTed entry can be read back, whole or as content."""
+    client, headers = client
+    response = client.post("/entry", data=b"Milk", headers=headers)
+    assert response.status_code == 200
+    posted = loads(response.data)
+    assert posted['content'] == "Milk"
+    assert posted['author'] == int(headers['uid'])
+    headers['elementid'] = str(posted['identifier'])
+    response = client.get("/entry", headers=headers)
+    assert response.status_code == 200
+    assert loads(response.data) == posted
+    response = client.get("/entry", headers={**headers, 'json': "0"})
+    assert response.get_data(as_text=True) == "Milk"
+
+
+def test_chosen_identifier(client):
+    """Check that a client's elementid is used, and can't be used twice."""
+    client, headers = client
+    headers['elementid'] = str(2 ** 62)
+    response = client.post("/entry", data=b"Milk", headers=headers)
+    assert loads(response.data)['identifier'] == 2 ** 62
+    response = client.post("/entry", data=b"Eggs", headers=headers)
+    assert response.status_code == 409
+
+
+def listed(client, headers) -> list:
+    """The entries by the user in headers, as returned by /list."""
+    response = client.get("/list", headers=headers)
+    assert response.status_code == 200
+    return [
+        entry for entry in loads(response.data)
+        if entry['author'] == int(headers['uid'])
+    ]
+
+
+def test_list(client):
+    """Check that /list returns every entry, in order of identifier."""
+    client, headers = client
+    posted = [
+        loads(client.post("/entry", data=content, headers=headers).data)
+        for content in (b"Milk", b"Eggs", b"Bread")
+    ]
+    assert listed(client, headers) == posted
+
+
+def test_delete(client):
+    """Check that a deleted entry is gone, and can't be deleted again."""
+    client, headers = client
+    posted = loads(client.post("/entry", data=b"Milk", headers=headers).data)
+    headers['elementid'] = str(posted['identifier'])
+    response = client.delete("/entry", headers=headers)
+    assert response.get_data(as_text=True) == "success"
+    assert client.get("/entry", headers=headers).status_code == 400
+    assert client.delete("/entry", headers=headers).status_code == 400
+    assert listed(client, headers) == []
+
+
+def test_unauthorized(client):
+    """Check that every route refuses a wrong token."""
+    client, headers = client
+    headers['token'] = "wrong"
+    headers['elementid'] = "1"
+    assert client.get("/entry", headers=headers).status_code == 401
+    assert client.post("/entry", data=b"Milk", headers=headers).status_code \
+        == 401
+    assert client.delete("/entry", headers=headers).status_code == 401
+    assert client.get("/list", headers=headers).status_code == 401
@@ -0,0 +1,151 @@
+"""Tests of the /entry route, through Flask's test client.
+
+Unlike test_routes.py these don't need a live server; they use the app's
+database and storage engine.
+"""
+from json import loads
+from sqlalchemy import event
+from api import app, db
+from api.models import User
+from api.wire import decode_entries, JSON, MSGPACK, CBOR, msgpack, cbor2
+from pytest import fixture, mark, skip
+
+
+@fixture
+def client():
+    """A test client, and the headers authenticating a new user."""
+    app.config['RATE_LIMIT_ENABLED'] = False
+    with app.app_context():
+        user = User("Entry Route User")
+        token = user.new_token(lambda token: token)
+        db.session.add(user)
+        db.session.commit()
+        headers = {'uid': str(user.identifier), 'token': token.decode()}
+        yield app.test_client(), headers
+        user.delete()
+    app.config['RATE_LIMIT_ENABLED'] = True
+
+
+def test_element_id_out_of_range(client):
+    """Check that IDs the database can't store are refused with 400."""
+    client, headers = client
+    for elementid in ("0", "-1", str(2 ** 63), str(2 ** 64)):
+        headers['elementid'] = elementid
+        assert client.get("/entry", headers=headers).status_code == 400
+        assert client.delete("/entry", headers=headers).status_code == 400
+        assert client.post(
+            "/entry", data=b"Milk", headers=headers
+        ).status_code == 400
+
+
+def test_element_ids_out_of_range(client):
+    """Check that every ID in a list is range checked, not just the first."""
+    client, headers = client
+    for elementid in ("1,18446744073709551616", "1,0", f"1,{2 ** 63}"):
+        headers['elementid'] = elementid
+        assert client.get("/entry", headers=headers).status_code == 400
+
+
+def post(client, headers, *contents) -> list:
+    """POST each of contents, returning the entries' attributes."""
+    return [
+        loads(client.post("/entry", data=content, headers=headers).data)
+        for content in contents
+    ]
+
+
+def test_lookup(client):
+    """Check that several IDs get the entries found, and the IDs missing."""
+    client, headers = client
+    milk, eggs = post(client, headers, b"Milk", b"Eggs")
+    missing = eggs['identifier'] + 1000
+    headers['elementid'] = ",".join(
+        str(each) for each in (eggs['identifier'], missing, milk['identifier'])
+    )
+    response = client.get("/entry", headers=headers)
+    assert response.status_code == 200
+    assert loads(response.data) == {
+        'entries': [milk, eggs], 'missing': [missing]
+    }
+
+
+def test_lookup_duplicates(client):
+    """Check that an ID named twice is only looked up, and listed, once."""
+    client, headers = client
+    milk, = post(client, headers, b"Milk")
+    missing = milk['identifier'] + 1000
+    headers['elementid'] = ",".join(
+        str(each) for each in (milk['identifier'], missing) * 2
+    )
+    assert loads(client.get("/entry", headers=headers).data) == {
+        'entries': [milk], 'missing': [missing]
+    }
+
+
+def test_lookup_too_many(client, monkeypatch):
+    """Check that more than GET_MANY_MAX IDs are refused with 400."""
+    client, headers = client
+    monkeypatch.setitem(app.config, 'GET_MANY_MAX', 2)
+    headers['elementid'] = "1,2"
+    assert client.get("/entry", headers=headers).status_code == 200
+    headers['elementid'] = "1,2,3"
+    response = client.get("/entry", headers=headers)
+    assert response.status_code == 400
+    assert response.get_data(as_text=True) \
+        == "Too many entry IDs! Received 3, max 2."
+
+
+def test_lookup_chunks(client, monkeypatch):
+    """Check that IDs are looked up GET_MANY_CHUNK_SIZE at a time."""
+    client, headers = client
+    monkeypatch.setitem(app.config, 'GET_MANY_CHUNK_SIZE', 2)
+    entries = post(client, headers, *(b"%d" % i for i in range(5)))
+    headers['elementid'] = ",".join(
+        str(each['identifier']) for each in entries
+    )
+    statements = []
+
+    def count(connection, cursor, statement, *args):
+        if "IN (" in statement and "list_entry" in statement:
+            statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        response = client.get("/entry", headers=headers)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    assert loads(response.data) == {'entries': entries, 'missing': []}
+    assert len(statements) == 3
+
+
+def test_single_id_unchanged(client):
+    """Check that a single ID still gets the entry itself, or its content."""
+    client, headers = client
+    milk, = post(client, headers, b"Milk")
+    headers['elementid'] = str(milk['identifier'])
+    assert loads(client.get("/entry", headers=headers).data) == milk
+    response = client.get("/entry", headers={**headers, 'json': "0"})
+    assert response.get_data(as_text=True) == "Milk"
+    assert response.mimetype == "text/plain"
+    # a trailing comma asks for the lookup layout, whatever 'json' says.
+    headers['elementid'] += ","
+    response = client.get("/entry", headers={**headers, 'json': "0"})
+    assert loads(response.data) == {'entries': [milk], 'missing': []}
+
+
+@mark.parametrize(
+    "mimetype, module", [(JSON, True), (MSGPACK, msgpack), (CBOR, cbor2)]
+)
+def test_accept(client, mimetype, module):
+    """Check that Accept chooses the encoding of /list and GET /entry."""
+    if module is None:
+        skip(f"No package to encode {mimetype} with.")
+    client, headers = client
+    milk, = post(client, headers, b"Milk")
+    headers['Accept'] = mimetype
+    for path, elementid in (("/list", None), ("/entry", milk['identifier'])):
+        if elementid is not None:
+            headers['elementid'] = str(elementid)
+        response = client.get(path, headers=headers)
+        assert response.headers['Content-Type'] == mimetype
+        assert "Accept" in response.vary
+        assert milk in decode_entries(response.data, mimetype)
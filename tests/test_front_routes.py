@@ -0,0 +1,94 @@
+"""Tests for the front_routes.py file in the api module."""
+from api import app, db, front_routes
+from api.models import User
+from api.storage import get_storage
+from pytest import fixture
+
+
+@fixture
+def client():
+    """A test client, the query string authenticating a user, and storage."""
+    app.config['RATE_LIMIT_ENABLED'] = False
+    with app.app_context():
+        user = User("Front Routes User")
+        token = user.new_token(lambda token: token)
+        db.session.add(user)
+        db.session.commit()
+        credentials = {'uid': user.identifier, 'token': token.decode()}
+        yield app.test_client(), credentials, get_storage()
+        user.delete()
+    app.config['RATE_LIMIT_ENABLED'] = True
+
+
+def test_unauthorized(client):
+    """Check that the page needs credentials."""
+    client, credentials, storage = client
+    assert client.get("/").status_code == 401
+    credentials['token'] = "wrong"
+    assert client.get("/", query_string=credentials).status_code == 401
+
+
+def test_render(client):
+    """Check that every entry is listed, with its content escaped."""
+    client, credentials, storage = client
+    milk = storage.add(content="Milk", author=credentials['uid'])
+    tag = storage.add(content="<b>Eggs & ham</b>", author=credentials['uid'])
+    response = client.get("/", query_string=credentials)
+    page = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert response.mimetype == "text/html"
+    assert f'id="entry-{milk[0]}"' in page
+    assert ">Milk</li>" in page
+    assert "&lt;b&gt;Eggs &amp; ham&lt;/b&gt;" in page
+    assert "<b>" not in page
+    assert page.rstrip().endswith("</html>")
+    assert tag in front_routes._fragments
+
+
+def test_cached_fragment(client):
+    """Check that a row's fragment is reused rather than rendered again."""
+    client, credentials, storage = client
+    row = storage.add(content="Milk", author=credentials['uid'])
+    client.get("/", query_string=credentials)
+    front_routes._fragments[row] = "<li>cached</li>"
+    page = client.get("/", query_string=credentials).get_data(as_text=True)
+    assert "<li>cached</li>" in page
+
+
+def test_fragments_pruned():
+    """Check that the cache doesn't outgrow the list it's rendering."""
+    front_routes._fragments = {("gone", i): "" for i in range(10)}
+    front_routes._fragments_version = 1
+    rows = [(1, "Milk", 1, 0.0)]
+    with app.app_context():
+        assert len(list(front_routes.fragments_for(rows, 1))) == 1
+    assert list(front_routes._fragments) == rows
+
+
+def test_concurrent_pages():
+    """Check that pages rendered at once don't break each other's cache."""
+    from sys import getswitchinterval, setswitchinterval
+    from threading import Thread
+    errors = []
+
+    def render(number: int):
+        rows = [(i, str(i), number, 0.0) for i in range(2000)]
+        try:
+            with app.app_context():
+                for version in range(20):
+                    list(front_routes.fragments_for(rows, version))
+        except Exception as error:
+            errors.append(error)
+
+    # switch threads as often as possible, so they interleave.
+    interval = getswitchinterval()
+    setswitchinterval(1e-6)
+    try:
+        threads = [Thread(target=render, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        setswitchinterval(interval)
+    assert errors == []
@@ -0,0 +1,68 @@
+"""Tests for the idempotency.py file in the api module."""
+from api import app
+from api.idempotency import (
+    IdempotencyStore, PENDING, fingerprint_of, idempotent_response, store
+)
+
+
+class TestIdempotencyStore:
+    """Tests for the IdempotencyStore class."""
+
+    def setup_method(self):
+        """A store keeping responses for 10 seconds, for up to 2 keys."""
+        self.store = IdempotencyStore(ttl=10, max_keys=2)
+
+    def test_claim(self):
+        """Check that a key is claimed once, and pending until finished."""
+        assert self.store.begin(1, "a", "print", now=0) is None
+        assert self.store.begin(1, "a", "print", now=1) == ("print", PENDING)
+        self.store.finish(1, "a", "print", (200, "text/plain", b"ok"), 10)
+        assert self.store.begin(1, "a", "print", now=2) \
+            == ("print", (200, "text/plain", b"ok"))
+
+    def test_keys_are_per_uid(self):
+        """Check that two users can use the same key."""
+        assert self.store.begin(1, "a", "print", now=0) is None
+        assert self.store.begin(2, "a", "print", now=0) is None
+
+    def test_expiry(self):
+        """Check that a key can be reused once its response has expired."""
+        self.store.begin(1, "a", "print", now=0)
+        self.store.finish(1, "a", "print", (200, "text/plain", b"ok"), 10)
+        assert self.store.begin(1, "a", "print", now=10) is None
+
+    def test_abandon(self):
+        """Check that an abandoned key can be claimed again."""
+        self.store.begin(1, "a", "print", now=0)
+        self.store.abandon(1, "a")
+        assert self.store.begin(1, "a", "print", now=0) is None
+
+    def test_max_keys(self):
+        """Check that the least recently used key is dropped."""
+        for key in "abc":
+            self.store.begin(1, key, "print", now=0)
+        assert (1, "a") not in self.store.entries
+        assert len(self.store.entries) == 2
+
+
+def test_idempotent_response():
+    """Check that a response is replayed, and only made once."""
+    calls = []
+
+    def handle():
+        calls.append(None)
+        return ("made", 200)
+
+    fingerprint = fingerprint_of(b"Milk", None, None)
+    with app.test_request_context():
+        first = idempotent_response(-1, "key", fingerprint, handle)
+        replay = idempotent_response(-1, "key", fingerprint, handle)
+        different = idempotent_response(
+            -1, "key", fingerprint_of(b"Eggs", None, None), handle
+        )
+    assert len(calls) == 1
+    assert first.status_code == 200
+    assert replay[:2] == (b"made", 200)
+    assert replay[2]['Idempotent-Replayed'] == 'true'
+    assert different[1] == 422
+    del store.entries[(-1, "key")]
@@ -0,0 +1,18 @@
+"""Tests for the loadgen.py file in the api module."""
+from api import app
+from api.loadgen import run
+from api.models import User, ListEntry
+
+
+def test_run_cleans_up():
+    """Check that a run reports its requests and leaves nothing behind."""
+    with app.app_context():
+        users, entries = User.query.count(), ListEntry.query.count()
+    try:
+        report = run(users=2, duration=0.2, concurrency=2)
+    finally:
+        app.config['RATE_LIMIT_ENABLED'] = True
+    assert report['requests'] > 0
+    with app.app_context():
+        assert User.query.count() == users
+        assert ListEntry.query.count() == entries
@@ -0,0 +1,123 @@
+"""Tests for the misc_functions.py file."""
+from misc_functions import (
+    check_isdir, hash_of_file, hash_of_files, hash_of_str, list_recursively,
+    percentile, snowflake_ids, snowflake_time, sync_tree
+)
+from hashlib import sha256
+from itertools import islice
+from os import utime
+from time import time
+import misc_functions
+
+
+class TestHashing:
+    """Tests for the file hashing functions."""
+
+    def test_text_file(self, tmp_path):
+        """Check that a text file hashes the same as its contents."""
+        (tmp_path / "file.txt").write_text("Some text\n")
+        assert hash_of_file(str(tmp_path), "file.txt") \
+            == hash_of_str("Some text\n")
+
+    def test_binary_file(self, tmp_path, monkeypatch):
+        """Check a binary file larger than one chunk."""
+        monkeypatch.setattr(misc_functions, 'HASH_CHUNK_SIZE', 1000)
+        content = bytes(range(256)) * 10
+        (tmp_path / "file.bin").write_bytes(content)
+        assert hash_of_file(str(tmp_path / "file.bin")) \
+            == sha256(content).hexdigest()
+
+    def test_tree(self, tmp_path):
+        """Check that every file in a tree is hashed."""
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "a").write_bytes(b"a")
+        (tmp_path / "sub" / "b").write_bytes(b"b")
+        assert hash_of_files(str(tmp_path), workers=2) == {
+            str(tmp_path / "a"): sha256(b"a").hexdigest(),
+            str(tmp_path / "sub" / "b"): sha256(b"b").hexdigest(),
+        }
+
+
+class TestSyncTree:
+    """Tests for incrementally syncing directories."""
+
+    def setup_method(self):
+        self.files = {"a": b"a", "sub/b": b"b", "sub/deeper/c": b"c"}
+
+    def make_tree(self, path):
+        for name, content in self.files.items():
+            (path / name).parent.mkdir(parents=True, exist_ok=True)
+            (path / name).write_bytes(content)
+        return path
+
+    def test_list_recursively(self, tmp_path):
+        """Check that every file is listed, however deep."""
+        self.make_tree(tmp_path)
+        assert sorted(list_recursively(str(tmp_path))) \
+            == sorted(str(tmp_path / name) for name in self.files)
+
+    def test_initial_sync(self, tmp_path):
+        """Check that a missing directory is created with every file."""
+        src = self.make_tree(tmp_path / "src")
+        dest = tmp_path / "dest"
+        assert sorted(sync_tree(str(src), str(dest))) == sorted(self.files)
+        for name, content in self.files.items():
+            assert (dest / name).read_bytes() == content
+
+    def test_only_changes_are_copied(self, tmp_path):
+        """Check that a second sync only copies what changed."""
+        src = self.make_tree(tmp_path / "src")
+        dest = tmp_path / "dest"
+        sync_tree(str(src), str(dest))
+        assert sync_tree(str(src), str(dest)) == []
+        (src / "sub" / "b").write_bytes(b"changed")
+        assert sync_tree(str(src), str(dest)) == ["sub/b"]
+        assert (dest / "sub" / "b").read_bytes() == b"changed"
+
+    def test_touched_file_is_not_copied(self, tmp_path):
+        """Check that a file with only a new mtime is compared by hash."""
+        src = self.make_tree(tmp_path / "src")
+        dest = tmp_path / "dest"
+        sync_tree(str(src), str(dest))
+        utime(src / "a", (0, 0))
+        assert sync_tree(str(src), str(dest)) == []
+        assert (dest / "a").stat().st_mtime == 0
+
+    def test_prune(self, tmp_path):
+        """Check that files missing from src are deleted only if asked."""
+        src = self.make_tree(tmp_path / "src")
+        dest = tmp_path / "dest"
+        sync_tree(str(src), str(dest))
+        (src / "a").unlink()
+        assert sync_tree(str(src), str(dest)) == []
+        assert (dest / "a").exists()
+        assert sync_tree(str(src), str(dest), prune=True) == ["a"]
+        assert not (dest / "a").exists()
+
+    def test_check_isdir(self, tmp_path):
+        """Check that an empty directory is filled, and synced if asked."""
+        src = self.make_tree(tmp_path / "src")
+        dest = tmp_path / "dest"
+        dest.mkdir()
+        assert check_isdir(str(dest), str(src))
+        assert (dest / "sub" / "deeper" / "c").read_bytes() == b"c"
+        (src / "a").write_bytes(b"changed")
+        assert check_isdir(str(dest), str(src), sync=True)
+        assert (dest / "a").read_bytes() == b"changed"
+
+
+def test_percentile():
+    """Check nearest-rank percentiles."""
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile(values, 100) == 100.0
+    assert percentile([], 50) == 0.0
+
+
+def test_snowflake_ids():
+    """Check that snowflake IDs are unique, ordered and carry their time."""
+    identifiers = list(islice(snowflake_ids(node=3), 10000))
+    assert identifiers == sorted(set(identifiers))
+    assert all(0 < identifier < 2 ** 63 for identifier in identifiers)
+    assert abs(snowflake_time(identifiers[-1]) - time()) < 5
@@ -73,3 +73,77 @@ class TestListEntry:
         assert self.name == User.query.get(
             ListEntry.query.get(self.entry.identifier).author
         )
+
+
+class TestDelete:
+    """Tests for the delete methods of User and ListEntry."""
+
+    def setup_method(self):
+        """A user with 5 entries, one of them archived."""
+        from api import app
+        from api.models import ArchivedListEntry
+        self.context = app.app_context()
+        self.context.push()
+        self.user = User("Delete Test User")
+        db.session.add(self.user)
+        db.session.commit()
+        self.uid = self.user.identifier
+        self.entries = [ListEntry(str(i), self.uid) for i in range(4)]
+        db.session.add_all(self.entries)
+        db.session.add(ArchivedListEntry(
+            identifier=self.entries[0].identifier + 1000, content="old",
+            author=self.uid, creation_time=0.0
+        ))
+        db.session.commit()
+
+    def teardown_method(self):
+        """Remove anything a failed test left behind."""
+        db.session.rollback()
+        User.delete(self.user, self.uid)
+        self.context.pop()
+
+    def test_delete_entry(self):
+        """Check that an entry is deleted by its ID, and only once."""
+        identifier = self.entries[0].identifier
+        assert ListEntry.delete(self.entries[0], identifier)
+        assert db.session.get(ListEntry, identifier) is None
+        assert not self.entries[1].delete(identifier)
+
+    def test_delete_user_cascades(self):
+        """Check that a user's entries go with them, in batches."""
+        from api.models import ArchivedListEntry
+        assert self.user.delete(batch_size=2) == 5
+        assert db.session.get(User, self.uid) is None
+        assert ListEntry.query.filter_by(author=self.uid).count() == 0
+        assert ArchivedListEntry.query.filter_by(author=self.uid).count() \
+            == 0
+
+    def test_delete_user_updates_stats(self):
+        """Check that deleting a user goes through the storage engine."""
+        from api.stats import get_columns
+        from api.storage import get_storage
+        identifiers = [entry.identifier for entry in self.entries]
+        columns = get_columns()
+        columns.load()
+        assert identifiers[0] in columns.positions
+        version = get_storage().version
+        self.user.delete()
+        assert get_storage().version == version + 5
+        # without the notifications, nothing would be reloaded for a minute.
+        columns.refresh()
+        for identifier in identifiers:
+            assert identifier not in columns.positions
+
+
+def test_snowflake_node(monkeypatch):
+    """Check that each process gets its own node unless one is set."""
+    from os import getpid
+    from api.models import new_identifier, snowflake_node
+    from config import Config
+    from misc_functions import SNOWFLAKE_SEQUENCE_BITS
+    monkeypatch.setattr(Config, 'SNOWFLAKE_NODE', None)
+    assert snowflake_node() == getpid() % 1024
+    node = (new_identifier() >> SNOWFLAKE_SEQUENCE_BITS) % 1024
+    assert node == snowflake_node()
+    monkeypatch.setattr(Config, 'SNOWFLAKE_NODE', 7)
+    assert snowflake_node() == 7
@@ -0,0 +1,48 @@
+"""Tests for the ndjson.py file in the api module."""
+from io import StringIO
+from api import app, db
+from api.models import User, ListEntry, ArchivedListEntry
+from api.ndjson import export_rows, import_rows, write_checkpoint
+
+
+def test_round_trip(tmp_path):
+    """Check that an export imports back, and that an import resumes."""
+    checkpoint = str(tmp_path / "checkpoint")
+    with app.app_context():
+        user = User("NDJSON Test User")
+        db.session.add(user)
+        db.session.commit()
+        uid = user.identifier
+        entries = [ListEntry(str(i), uid) for i in range(3)]
+        archived = entries[0].identifier + 1000
+        db.session.add_all(entries + [ArchivedListEntry(
+            identifier=archived, content="old", author=uid, creation_time=0.0
+        )])
+        db.session.commit()
+        export = StringIO()
+        lines = export_rows(export, batch_size=2)
+        before = sorted(
+            row.row for row in ListEntry.query.filter_by(author=uid)
+        )
+        try:
+            user.delete()
+            export.seek(0)
+            assert import_rows(
+                export, checkpoint=checkpoint, chunk_size=2
+            ) == lines
+            assert db.session.get(User, uid).readable_name \
+                == "NDJSON Test User"
+            assert sorted(
+                row.row for row in ListEntry.query.filter_by(author=uid)
+            ) == before
+            assert db.session.get(ArchivedListEntry, archived).content == "old"
+            # as if the import crashed after committing its last chunk, but
+            # before writing the checkpoint.
+            write_checkpoint(checkpoint, lines - 2)
+            export.seek(0)
+            assert import_rows(
+                export, checkpoint=checkpoint, chunk_size=2
+            ) == 2
+            assert ListEntry.query.filter_by(author=uid).count() == 3
+        finally:
+            User.delete(user, uid)
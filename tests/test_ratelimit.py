@@ -0,0 +1,37 @@
+"""Tests for the ratelimit.py file in the api module."""
+from api.ratelimit import RateLimiter
+
+
+class TestRateLimiter:
+    """Tests for the RateLimiter class."""
+
+    def setup_method(self):
+        """A limiter allowing a burst of 3, refilling one token per second."""
+        self.limiter = RateLimiter(rate=1.0, burst=3, max_keys=2)
+
+    def test_burst(self):
+        """Check that the burst is allowed and the next request isn't."""
+        for _ in range(3):
+            assert self.limiter.check("uid:1", now=0.0) == 0
+        assert self.limiter.check("uid:1", now=0.0) == 1.0
+
+    def test_refill(self):
+        """Check that tokens come back at the configured rate."""
+        for _ in range(3):
+            self.limiter.check("uid:1", now=0.0)
+        assert self.limiter.check("uid:1", now=0.5) == 0.5
+        assert self.limiter.check("uid:1", now=1.0) == 0
+
+    def test_keys_are_independent(self):
+        """Check that limiting one key doesn't affect another."""
+        for _ in range(4):
+            self.limiter.check("uid:1", now=0.0)
+        assert self.limiter.check("uid:2", now=0.0) == 0
+
+    def test_max_keys(self):
+        """Check that the least recently used bucket is dropped."""
+        self.limiter.check("uid:1", now=0.0)
+        self.limiter.check("uid:2", now=0.0)
+        self.limiter.check("uid:3", now=0.0)
+        assert "uid:1" not in self.limiter.buckets
+        assert len(self.limiter.buckets) == 2
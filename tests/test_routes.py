@@ -1,4 +1,11 @@
-"""Tests for the routes.py file in the api module."""
+"""Tests for the routes.py file in the api module.
+
+These run against a live server. To run them against each storage engine,
+start the server with SHOPPING_LIST_STORAGE set to "sqlalchemy",
+"appendlog" or "sharded" (see api.storage). test_engine_routes.py runs the
+same requests against each engine through Flask's test client, without a
+server.
+"""
 from api.routes import user_is_unauthorized
 from api.models import User, ListEntry
 from config import Config
@@ -0,0 +1,86 @@
+"""Tests for the sessions.py file in the api module."""
+from api import app, db, sessions
+from api.models import User
+
+
+class TestSessions:
+    """Tests for issuing and checking session credentials."""
+    uid = 12345
+    token_hash = "pbkdf2:sha256:50000$salt$hash"
+
+    def setup_method(self):
+        self.credential, self.expires = sessions.issue(
+            self.uid, self.token_hash
+        )
+
+    def teardown_method(self):
+        sessions.current_generation.pop(self.uid, None)
+
+    def test_valid(self):
+        """Check that a freshly issued credential is accepted."""
+        assert sessions.is_valid(self.credential, self.uid)
+
+    def test_wrong_user(self):
+        """Check that a credential is only accepted for its own uid."""
+        assert not sessions.is_valid(self.credential, self.uid + 1)
+
+    def test_tampered(self):
+        """Check that changing any part of a credential invalidates it."""
+        uid, expires, generation, signature = self.credential.split('.')
+        later = f"{uid}.{int(expires) + 3600}.{generation}.{signature}"
+        assert not sessions.is_valid(later, self.uid)
+        assert not sessions.is_valid(self.credential[:-1], self.uid)
+        assert not sessions.is_valid("garbage", self.uid)
+
+    def test_expired(self):
+        """Check that an expired credential is refused."""
+        credential, _ = sessions.issue(self.uid, self.token_hash, -1)
+        assert not sessions.is_valid(credential, self.uid)
+
+    def test_new_token_revokes(self):
+        """Check that a new token hash revokes the old credentials."""
+        sessions.note_token_hash(self.uid, "a different hash")
+        assert not sessions.is_valid(self.credential, self.uid)
+
+
+class TestGenerationLookup:
+    """Tests for checking credentials in a process which didn't issue them."""
+
+    def setup_method(self):
+        """A user with a credential, forgotten by this process."""
+        self.context = app.app_context()
+        self.context.push()
+        self.user = User("Session Test User")
+        self.user.token_hash = "sha256$$first"
+        db.session.add(self.user)
+        db.session.commit()
+        self.uid = self.user.identifier
+        self.credential, _ = sessions.issue(self.uid, self.user.token_hash)
+        sessions.current_generation.clear()
+
+    def teardown_method(self):
+        sessions.current_generation.clear()
+        User.delete(self.user, self.uid)
+        self.context.pop()
+
+    def test_looked_up(self):
+        """Check that the current token hash is looked up when unknown."""
+        assert sessions.is_valid(self.credential, self.uid)
+        assert self.uid in sessions.current_generation
+
+    def test_unknown_user(self):
+        """Check that credentials for users who don't exist are refused."""
+        credential, _ = sessions.issue(-1, "sha256$$first")
+        sessions.current_generation.clear()
+        assert not sessions.is_valid(credential, -1)
+
+    def test_new_token_elsewhere(self):
+        """Check that a new token made by another process revokes it."""
+        assert sessions.is_valid(self.credential, self.uid)
+        self.user.token_hash = "sha256$$second"
+        db.session.commit()
+        app.config['SESSION_GENERATION_MAX_AGE'] = 0
+        try:
+            assert not sessions.is_valid(self.credential, self.uid)
+        finally:
+            app.config['SESSION_GENERATION_MAX_AGE'] = 30
@@ -0,0 +1,110 @@
+"""Tests for the stats.py file in the api module."""
+from threading import Thread
+from api import app, db
+from api.models import User
+from api.stats import EntryColumns, sql_summary, numpy
+from api.storage.appendlog import AppendLogStorage
+from api.storage.sql import SQLAlchemyStorage
+from pytest import fixture, skip
+
+
+@fixture
+def uid():
+    """A user with a few entries in the app's database."""
+    app.config['RATE_LIMIT_ENABLED'] = False
+    with app.app_context():
+        user = User("Stats Test User")
+        user.token_hash = "sha256$$unused"
+        db.session.add(user)
+        db.session.commit()
+        storage = SQLAlchemyStorage()
+        for content in ("Milk", "Eggs", "Milk", "Bread", "Milk", "Eggs"):
+            storage.add(content=content, author=user.identifier)
+        yield user.identifier
+        user.delete()
+    app.config['RATE_LIMIT_ENABLED'] = True
+
+
+@fixture
+def log(tmp_path):
+    """An append-only log storage engine, for a cache to follow."""
+    storage = AppendLogStorage(str(tmp_path / "entries.log"))
+    yield storage
+    storage.close()
+
+
+def test_summaries_agree(uid):
+    """Check that NumPy, Counter and GROUP BY give the same statistics."""
+    if numpy is None:
+        skip("NumPy isn't installed.")
+    columns = EntryColumns(SQLAlchemyStorage())
+    columns.load()
+    expected = sql_summary(3)
+    assert expected['entries_per_author'][uid] == 6
+    assert columns._numpy_summary(3) == expected
+    assert columns._counter_summary(3) == expected
+
+
+def test_follows_changes(log):
+    """Check that adds and deletes are applied without reloading."""
+    columns = EntryColumns(log)
+    log.add(content="Milk", author=1)
+    with app.app_context():
+        assert columns.summary()['entries'] == 1
+        loaded_at = columns.loaded_at
+        eggs = log.add(content="Eggs", author=2)
+        log.add(content="Milk", author=2)
+        assert columns.summary()['top_items'] == [["Milk", 2], ["Eggs", 1]]
+        log.delete(eggs[0])
+        summary = columns.summary()
+    assert columns.loaded_at == loaded_at
+    assert summary['entries'] == 2
+    assert summary['entries_per_author'] == {1: 1, 2: 1}
+
+
+def test_add_while_loading(log):
+    """Check that an entry added during a load is counted once."""
+    columns = EntryColumns(log)
+    columns.load()
+    read = log.all
+
+    def all_then_add():
+        # the listener sees the new row, and so does the load.
+        log.add(content="Eggs", author=1)
+        return read()
+
+    log.all = all_then_add
+    columns.load()
+    log.all = read
+    assert list(columns.identifiers) == [row[0] for row in log.all()]
+
+
+def test_no_deadlock(log):
+    """Check that reloading while entries are added doesn't hang."""
+    columns = EntryColumns(log)
+    columns.load()
+
+    def reload():
+        for _ in range(200):
+            columns.load()
+
+    reloader = Thread(target=reload, daemon=True)
+    reloader.start()
+    for i in range(200):
+        log.add(content=str(i), author=1)
+    reloader.join(timeout=10)
+    assert not reloader.is_alive()
+    columns.load()
+    assert len(columns.identifiers) == 200
+
+
+def test_negative_top(uid):
+    """Check that /stats refuses a negative top."""
+    headers = {'uid': str(uid), 'session': None}
+    from api import sessions
+    headers['session'], _ = sessions.issue(uid, "sha256$$unused")
+    client = app.test_client()
+    assert client.get("/stats", headers={**headers, 'top': "-1"}) \
+        .status_code == 400
+    assert client.get("/stats", headers={**headers, 'top': "1"}) \
+        .status_code == 200
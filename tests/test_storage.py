@@ -0,0 +1,192 @@
+"""Tests for the storage engines in the api.storage package.
+
+Every test runs against each engine, through the common Storage interface.
+"""
+from api import app, db
+from api.storage import EntryExists
+from api.storage.sql import SQLAlchemyStorage
+from api.storage.appendlog import AppendLogStorage
+from api.storage.sharded import ShardedStorage
+from pytest import fixture, raises
+
+
+@fixture(params=["sqlalchemy", "appendlog", "sharded"])
+def storage(request, tmp_path):
+    """An empty instance of each storage engine."""
+    if request.param == "appendlog":
+        engine = AppendLogStorage(str(tmp_path / "entries.log"))
+        yield engine
+        engine.close()
+        return
+    if request.param == "sharded":
+        yield ShardedStorage([
+            str(tmp_path / f"shard-{number}.db") for number in range(3)
+        ])
+        return
+    with app.app_context():
+        engine = SQLAlchemyStorage()
+        existing = {row[0] for row in engine.all()}
+        yield engine
+        for row in engine.all():
+            if row[0] not in existing:
+                engine.delete(row[0])
+
+
+def test_add_and_get(storage):
+    """Check that an added entry can be retrieved."""
+    row = storage.add(content="Milk", author=1)
+    assert row[1:3] == ("Milk", 1)
+    assert storage.get(row[0])[:3] == row[:3]
+    assert storage.get(-1) is None
+
+
+def test_all(storage):
+    """Check that all entries are listed in order of identifier."""
+    before = len(storage.all())
+    first = storage.add(content="Milk", author=1)
+    second = storage.add(content="Eggs", author=2)
+    rows = storage.all()
+    assert len(rows) == before + 2
+    assert [row[:3] for row in rows[-2:]] == [first[:3], second[:3]]
+    assert [row[0] for row in rows] == sorted(row[0] for row in rows)
+
+
+def test_delete(storage):
+    """Check that a deleted entry is gone, and can't be deleted again."""
+    row = storage.add(content="Milk", author=1)
+    assert storage.delete(row[0])
+    assert storage.get(row[0]) is None
+    assert not storage.delete(row[0])
+    assert row[0] not in [each[0] for each in storage.all()]
+
+
+def test_get_many(storage):
+    """Check that several entries are looked up at once, in order."""
+    rows = [storage.add(content=str(i), author=1) for i in range(3)]
+    identifiers = [rows[2][0], -1, rows[0][0], rows[2][0]]
+    assert [row[:3] for row in storage.get_many(identifiers)] \
+        == [rows[0][:3], rows[2][:3]]
+    assert storage.get_many([]) == []
+
+
+def test_client_identifier(storage):
+    """Check that a client's identifier is used, but only once."""
+    identifier = storage.add(content="Milk", author=1)[0] + 1000
+    row = storage.add(content="Eggs", author=2, identifier=identifier)
+    assert row[0] == identifier
+    assert storage.get(identifier)[:3] == row[:3]
+    with raises(EntryExists):
+        storage.add(content="Eggs", author=2, identifier=identifier)
+
+
+def test_delete_by_author(storage):
+    """Check that an author's entries are deleted, and listeners told."""
+    deleted = []
+    storage.add_listener(lambda added, gone: deleted.append(gone))
+    author = 987654
+    rows = [storage.add(content=str(i), author=author) for i in range(5)]
+    kept = storage.add(content="Milk", author=author + 1)
+    deleted.clear()
+    assert storage.delete_by_author(author, batch_size=2) == 5
+    assert sorted(deleted) == [row[0] for row in rows]
+    remaining = storage.all()
+    assert kept[:3] in [row[:3] for row in remaining]
+    assert author not in [row[2] for row in remaining]
+    assert storage.delete_by_author(author, batch_size=2) == 0
+
+
+def test_largest_identifier(storage):
+    """Check that the largest identifier doesn't stop later adds."""
+    largest = 2**63 - 1
+    storage.add(content="Milk", author=1, identifier=largest)
+    assert storage.get(largest)[:3] == (largest, "Milk", 1)
+    assert storage.add(content="Eggs", author=1)[0] < largest
+
+
+class TestAppendLogStorage:
+    """Tests specific to the append-only log engine."""
+
+    def open(self, path, **kwargs):
+        return AppendLogStorage(str(path / "entries.log"), **kwargs)
+
+    def test_reopen(self, tmp_path):
+        """Check that entries survive closing and reopening the log."""
+        storage = self.open(tmp_path)
+        kept = storage.add(content="Milk", author=1)
+        storage.delete(storage.add(content="Eggs", author=1)[0])
+        storage.close()
+        storage = self.open(tmp_path)
+        assert storage.all() == [kept]
+        assert storage.add(content="Bread", author=1)[0] > kept[0]
+        storage.close()
+
+    def test_rebuild_index(self, tmp_path):
+        """Check that a lost index is rebuilt from the log."""
+        storage = self.open(tmp_path)
+        rows = [storage.add(content=str(i), author=1) for i in range(100)]
+        storage.delete(rows[50][0])
+        storage.close()
+        (tmp_path / "entries.log.idx").unlink()
+        storage = self.open(tmp_path)
+        assert storage.all() == rows[:50] + rows[51:]
+        storage.close()
+
+    def test_old_index(self, tmp_path):
+        """Check that an index in an older format is rebuilt."""
+        storage = self.open(tmp_path)
+        rows = [storage.add(content=str(i), author=1) for i in range(3)]
+        storage.close()
+        index = tmp_path / "entries.log.idx"
+        index.write_bytes(b"SLI1" + index.read_bytes()[4:])
+        storage = self.open(tmp_path)
+        assert storage.all() == rows
+        storage.close()
+
+    def test_truncated_record(self, tmp_path):
+        """Check that a partially written record is discarded."""
+        storage = self.open(tmp_path)
+        kept = storage.add(content="Milk", author=1)
+        storage.add(content="Eggs", author=1)
+        storage.close()
+        log = tmp_path / "entries.log"
+        log.write_bytes(log.read_bytes()[:-2])
+        storage = self.open(tmp_path)
+        assert storage.all() == [kept]
+        storage.close()
+
+    def test_compaction(self, tmp_path):
+        """Check that deleted entries are dropped from the log."""
+        storage = self.open(tmp_path, min_compact_bytes=0)
+        rows = [storage.add(content=str(i), author=1) for i in range(10)]
+        for row in rows[:9]:
+            storage.delete(row[0])
+        assert storage.all() == rows[9:]
+        assert storage.dead_bytes < storage.log_length
+        assert (tmp_path / "entries.log").stat().st_size \
+            == storage.log_length
+        storage.close()
+
+
+def test_sharding(tmp_path):
+    """Check that entries go to their author's shard, and are all listed."""
+    storage = ShardedStorage([
+        str(tmp_path / f"shard-{number}.db") for number in range(3)
+    ])
+    rows = [
+        storage.add(content=f"Item {i}", author=author)
+        for i in range(4) for author in range(3)
+    ]
+    for row in rows:
+        assert row in storage._read_shard(row[2] % 3)
+        assert storage.get(row[0]) == row
+    assert storage.all() == sorted(rows)
+
+
+def test_shard_primary_key(tmp_path):
+    """Check that an identifier taken in the meantime raises EntryExists."""
+    storage = ShardedStorage([str(tmp_path / "shard-0.db")])
+    row = storage.add(content="Milk", author=1)
+    # as if another process added it between the check and the insert.
+    with raises(EntryExists):
+        storage._insert("Eggs", 1, row[0])
+    assert storage.all() == [row]
@@ -0,0 +1,61 @@
+"""Tests for the tokens.py file in the api module."""
+from api import app, db
+from api.models import User
+from api.tokens import check_token_hash, hash_token, needs_rehash
+from pytest import fixture
+
+token = b"0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+@fixture
+def hmac_key():
+    """A TOKEN_HASH_KEY for the hmac-sha256 method."""
+    app.config['TOKEN_HASH_KEY'] = "test key"
+    yield
+    app.config['TOKEN_HASH_KEY'] = None
+
+
+def test_fast_methods(hmac_key):
+    """Check that tokens match their sha256 and hmac-sha256 hashes only."""
+    for method in ("sha256", "hmac-sha256"):
+        token_hash = hash_token(token, method)
+        assert token_hash.startswith(method + "$")
+        assert check_token_hash(token_hash, token)
+        assert not check_token_hash(token_hash, token + b"0")
+    assert hash_token(token, "sha256") != hash_token(token, "hmac-sha256")
+
+
+def test_werkzeug_method():
+    """Check that werkzeug's methods are still supported."""
+    token_hash = hash_token(token, "pbkdf2:sha256:1000")
+    assert check_token_hash(token_hash, token)
+    assert not check_token_hash(token_hash, token + b"0")
+    assert not check_token_hash(None, token)
+
+
+def test_needs_rehash():
+    """Check that only hashes made by another scheme need redoing."""
+    assert not needs_rehash("sha256$$ab", "sha256")
+    assert needs_rehash("hmac-sha256$$ab", "sha256")
+    assert needs_rehash("pbkdf2:sha256:600000$salt$ab", "sha256")
+    assert not needs_rehash("scrypt:32768:8:1$salt$ab", "scrypt")
+    assert needs_rehash("scrypt:32768:8:1$salt$ab", "pbkdf2:sha256")
+
+
+def test_rehash_on_check(hmac_key):
+    """Check that a stored hash moves to the configured scheme."""
+    with app.app_context():
+        user = User("Token Test User")
+        user.token_hash = hash_token(token, "sha256")
+        db.session.add(user)
+        db.session.commit()
+        app.config['TOKEN_HASH_METHOD'] = "hmac-sha256"
+        try:
+            assert not user.check_token(b"wrong")
+            assert user.token_hash.startswith("sha256$")
+            assert user.check_token(token)
+            assert user.token_hash.startswith("hmac-sha256$")
+            assert db.session.get(User, user.identifier).check_token(token)
+        finally:
+            app.config['TOKEN_HASH_METHOD'] = "sha256"
+            user.delete()
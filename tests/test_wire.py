@@ -0,0 +1,48 @@
+"""Tests for the wire.py file in the api module."""
+from api.wire import (
+    columns_of, decode_entries, encode_entries, encode_entry, encode_lookup,
+    negotiate, ENTRY_FIELDS, JSON, MSGPACK, CBOR, msgpack, cbor2
+)
+from werkzeug.datastructures import MIMEAccept
+from pytest import mark, skip
+
+
+rows = [
+    (1, "Milk", 1, 1526860000),
+    (2, "Eggs", 2, 1526860005),
+]
+entries = [dict(zip(ENTRY_FIELDS, row)) for row in rows]
+
+
+def test_columns_of():
+    """Check the columnar layout of a list of rows."""
+    assert columns_of(rows) == {
+        'identifier':       [1, 2],
+        'content':          ["Milk", "Eggs"],
+        'author':           [1, 2],
+        'creation_time':    [1526860000, 1526860005],
+    }
+    assert columns_of([]) == {field: [] for field in ENTRY_FIELDS}
+
+
+def test_negotiate_defaults_to_JSON():
+    """Check that JSON is chosen without a preference, or a known type."""
+    assert negotiate(MIMEAccept()) == JSON
+    assert negotiate(MIMEAccept([('*/*', 1)])) == JSON
+    assert negotiate(MIMEAccept([('text/html', 1)])) == JSON
+
+
+@mark.parametrize(
+    "mimetype, module", [(JSON, True), (MSGPACK, msgpack), (CBOR, cbor2)]
+)
+def test_round_trip(mimetype, module):
+    """Check that lists and single entries decode to what was encoded."""
+    if module is None:
+        skip(f"No package to encode {mimetype} with.")
+    assert decode_entries(encode_entries(rows, mimetype), mimetype) \
+        == entries
+    assert decode_entries(encode_entries([], mimetype), mimetype) == []
+    assert decode_entries(encode_entry(rows[0], mimetype), mimetype) \
+        == entries[:1]
+    assert decode_entries(encode_lookup(rows, [3], mimetype), mimetype) \
+        == entries